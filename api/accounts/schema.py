@@ -1,5 +1,8 @@
 import copy
 
+import api.database
+from api.common import CASE_INSENSITIVE
+
 ACCOUNT = {
     '_type':
     'dict',
@@ -42,6 +45,20 @@ ACCOUNT = {
     }
 }
 
+# Fields filtered by text in GET /admin/accounts.
+api.database.Index('accounts', [('email', 1)], collation=CASE_INSENSITIVE)
+api.database.Index('accounts', [('username', 1)], collation=CASE_INSENSITIVE)
+api.database.Index('accounts', [('name', 1)], collation=CASE_INSENSITIVE)
+api.database.Index('accounts', [('last_name', 1)], collation=CASE_INSENSITIVE)
+# Exact lookups on register, login and password change. Usernames of accounts
+# made with Sign-In with Google are not checked, so they are not unique.
+api.database.Index('accounts', [('email', 1)], unique=True)
+api.database.Index('accounts', [('username', 1)])
+api.database.Index('registers', [('code', 1)])
+api.database.Index('password_changes', [('email', 1), ('token', 1)])
+api.database.expiring('registers')
+api.database.expiring('password_changes')
+
 UPDATE_ACCOUNT = copy.copy(ACCOUNT)
 del UPDATE_ACCOUNT['password']
 del UPDATE_ACCOUNT['email']
@@ -3,17 +3,14 @@ import random
 import time
 from typing import Dict, Union
 
-import argon2
-
 import api.accounts.schema as schema
 import api.database as database
 import api.mailing as mailing
+from api import passwords
 from api.common import ServiceRequest, ServiceResponse
 from api.errors import api_error
 from api.middlewares import require_auth, validate
 
-ph = argon2.PasswordHasher()
-
 database.Embed('author', 'author_id', 'accounts')
 
 
@@ -46,14 +43,19 @@ def register(r: ServiceRequest) -> ServiceResponse:
         return ServiceResponse(403, errors=api_error('username_taken'))
 
     account['role'] = 'user'
-    account['password'] = ph.hash(account['password'])
+    try:
+        account['password'] = passwords.hash(account['password'])
+    except passwords.Saturated:
+        return ServiceResponse(503, errors=api_error('server_busy'))
 
     code = _get_registration_code()
-    response = database.insert_one('registers', {
-        'code': code,
-        'account': account,
-        'exp': int(time.time()) + 3600,
-    })
+    response = database.insert_one(
+        'registers',
+        database.with_expiry({
+            'code': code,
+            'account': account,
+            'exp': int(time.time()) + 3600,
+        }))
     error = mailing.send_mail(account['email'], 'Rejestracja w PreExam',
                               mailing.REGISTER, {'register_code': code})
     if error:
@@ -95,11 +97,13 @@ def forgot_password(r: ServiceRequest) -> ServiceResponse:
         return ServiceResponse(204)
 
     token = _get_password_reset_code(email)
-    response = database.insert_one('password_changes', {
-        'token': token,
-        'exp': int(time.time()) + 3600,
-        'email': email
-    })
+    response = database.insert_one(
+        'password_changes',
+        database.with_expiry({
+            'token': token,
+            'exp': int(time.time()) + 3600,
+            'email': email
+        }))
     if response.errors:
         return response
     reset_link = f"www.preexam.pl/app/reset-password/{token}/{email}"
@@ -127,10 +131,14 @@ def confirm_password_change(r: ServiceRequest) -> ServiceResponse:
         return ServiceResponse(403,
                                errors=api_error('password_reset_code_expired'))
 
+    try:
+        password_hash = passwords.hash(r.content['new_password'])
+    except passwords.Saturated:
+        return ServiceResponse(503, errors=api_error('server_busy'))
     database.db.accounts.find_one_and_update(
         {'email': email},
         {'$set': {
-            'password': ph.hash(r.content['new_password'])
+            'password': password_hash
         }})
     database.delete_one('password_changes', password_reset['_id'])
     error = mailing.send_mail(email, 'Zmiana hasła w PreExam.',
@@ -190,12 +198,16 @@ def quick_password_change(req: ServiceRequest) -> ServiceResponse:
     })
 
     try:
-        ph.verify(account['password'], req.content['old_password'])
-    except argon2.exceptions.VerifyMismatchError:
-        return ServiceResponse(403, errors=api_error('invalid_old_password'))
+        if not passwords.verify(account.get('password', ''),
+                                req.content['old_password']):
+            return ServiceResponse(403,
+                                   errors=api_error('invalid_old_password'))
+        password_hash = passwords.hash(req.content['new_password'])
+    except passwords.Saturated:
+        return ServiceResponse(503, errors=api_error('server_busy'))
 
     error = mailing.send_mail(account['email'], 'Zmiana hasła w PreExam.',
                               mailing.PASSWORD_CHANGED)
     return database.update_one('accounts', user_id, {
-        'password': ph.hash(req.content['new_password'])
+        'password': password_hash
     }) if not error else ServiceResponse(500, errors=error)
@@ -15,6 +15,10 @@ endpoints: List[rest.ResourceEndpoint] = [
     rest.get('/admin/accounts',
              accounts.query,
              query_schema=schema.ACCOUNTS_QUERY),
+    rest.get('/admin/accounts/export',
+             accounts.export,
+             query_schema=schema.ACCOUNTS_EXPORT_QUERY,
+             secondary_reads=True),
     rest.post('/admin/accounts/<int:account_id>/init_password_change',
               accounts.init_password_change),
     rest.delete('/admin/accounts/<int:account_id>', accounts.delete),
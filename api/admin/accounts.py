@@ -6,7 +6,7 @@ import api.mailing as mailing
 from api.accounts.service import forgot_password
 from api.common.service import ServiceRequest, ServiceResponse
 from api.errors import api_error
-from api.middlewares.authentication import require_auth
+from api.middlewares.authentication import invalidate_user_sessions, require_auth
 from api.middlewares.validator import validate
 
 
@@ -35,7 +35,7 @@ def block(r: ServiceRequest, account_id: int) -> ServiceResponse:
     )
     if error:
         return ServiceResponse(500, errors=error)
-    return db.update_one(
+    res = db.update_one(
         "accounts",
         account_id,
         {
@@ -46,6 +46,10 @@ def block(r: ServiceRequest, account_id: int) -> ServiceResponse:
             }
         },
     )
+    # Blocked user is logged out.
+    db.db.session_tokens.delete_many({"user_id": account_id})
+    invalidate_user_sessions(account_id)
+    return res
 
 
 @require_auth("admin")
@@ -63,12 +67,17 @@ def unblock(r: ServiceRequest, account_id: int) -> ServiceResponse:
 
 @require_auth("admin")
 def query(r: ServiceRequest) -> ServiceResponse:
-    if isinstance(r.query.projection, dict):
-        r.query.projection["password"] = False
-        r.query.projection["history"] = False
+    r.query.hide("password", "history")
     return db.find_with_query("accounts", r.query)
 
 
+@require_auth("admin")
+def export(r: ServiceRequest) -> ServiceResponse:
+    """Streams all matching accounts as NDJSON."""
+    r.query.hide("password", "history")
+    return db.stream_with_query("accounts", r.query)
+
+
 @require_auth("admin")
 def init_password_change(r: ServiceRequest, account_id: int) -> ServiceResponse:
     db_query = db.find_one_by_id("accounts", account_id)
@@ -92,7 +101,10 @@ def delete(r: ServiceRequest, account_id: int) -> ServiceResponse:
 
     for col in db.db.collection_names():
         db.db[col].update_many({"author_id": account_id}, {"$set": {"author_id": 0}})
+        db.versions.bump(col)
     db.delete_one("accounts", account_id)
+    db.db.session_tokens.delete_many({"user_id": account_id})
+    invalidate_user_sessions(account_id)
     mailing.send_mail(
         account["email"], "Usunięcie konta w PreExam.", mailing.ACCOUNT_DELETED,
         {
@@ -113,4 +125,10 @@ def change_role(r: ServiceRequest, account_id: int) -> ServiceResponse:
     if account["role"] == "admin":
         return ServiceResponse(403, errors=api_error("cannot_change_admins_role"))
 
-    return db.update_one("accounts", account["_id"], {"role": r.content["role"]})
\ No newline at end of file
+    res = db.update_one("accounts", account["_id"], {"role": r.content["role"]})
+    # Role is copied to sessions on login, so change it in active ones too.
+    db.db.session_tokens.update_many(
+        {"user_id": account_id}, {"$set": {"role": r.content["role"]}}
+    )
+    invalidate_user_sessions(account_id)
+    return res
\ No newline at end of file
@@ -1,5 +1,7 @@
 import time
 
+from api.common.schema import delete_keys
+
 BLOCK_ACCOUNT = {
     "_type": "dict",
     "required": ["blocked_to", "blocked_for"],
@@ -21,9 +23,28 @@ CHANGE_ROLE = {
     }
 }
 
+# Fields which can be selected with fields= query param.
+# Password and history are never returned.
+ACCOUNT_FIELDS = [
+    "_id",
+    "email",
+    "username",
+    "name",
+    "last_name",
+    "newsletter",
+    "show_history",
+    "role",
+    "blocked",
+]
+
 ACCOUNTS_QUERY = {
     "_type": "dict",
     "required": [],
+    "fields": {
+        "_type": "list",
+        "max_elements": 20,
+        "_items": {"_type": "enum", "values": ACCOUNT_FIELDS},
+    },
     "exclude": {
         "_type": "list",
         "max_elements": 20,
@@ -60,6 +81,8 @@ ACCOUNTS_QUERY = {
     },
     "limit": {"_type": "int", "min": 1, "max": 200,},
     "skip": {"_type": "int", "min": 1,},
+    "after": {"_type": "str", "max": 2000},
+    "count": {"_type": "enum", "values": ["exact", "estimated", "none"]},
     "_id": {"_type": "list", "max_elements": 100, "_items": {"_type": "int",}},
     "blocked_to": {
         "_type": "list",
@@ -87,13 +110,17 @@ ACCOUNTS_QUERY = {
     },
     "name": {
         "_type": "list",
+        "max_elements": 20,
         "_items": {"_type": "str", "min": 4, "max": 30, "pattern": r"^[a-źA-Ź]+?$"},
     },
     "last_name": {
         "_type": "list",
+        "max_elements": 20,
         "_items": {"_type": "str", "min": 4, "max": 30, "pattern": r"^[a-źA-Ź]+?$"},
     },
-    "newsletter": {"_type": "list", "_items": {"_type": "bool"}},
-    "show_history": {"_type": "list", "_items": {"_type": "bool"}},
+    "newsletter": {"_type": "list", "max_elements": 20, "_items": {"_type": "bool"}},
+    "show_history": {"_type": "list", "max_elements": 20, "_items": {"_type": "bool"}},
 }
 
+# Export has no pagination.
+ACCOUNTS_EXPORT_QUERY = delete_keys(ACCOUNTS_QUERY, ["limit", "skip", "after", "count"])
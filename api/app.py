@@ -1,6 +1,6 @@
 from typing import List
 
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request
 from flask_cors import CORS
 
 import api.common.rest
@@ -8,6 +8,7 @@ import api.database
 from api import (
     admin,
     accounts,
+    batch,
     user_session,
     questions,
     quizzes,
@@ -34,8 +35,24 @@ def init_app() -> Flask:
         images.endpoints,
         categories.endpoints,
         status.endpoints,
+        batch.endpoints,
     ]
 
+    @app.before_request
+    def count_database_commands():
+        api.database.monitoring.start()
+
+    @app.after_request
+    def report_database_commands(response):
+        stats = api.database.monitoring.finish()
+        if stats:
+            api.database.monitoring.log_request(
+                request.method, request.path, response.status_code, stats
+            )
+            if api.database.monitoring.TIMING_HEADER:
+                response.headers["Server-Timing"] = stats.server_timing()
+        return response
+
     @app.errorhandler(404)
     def not_found(error):
         return jsonify([errors.api_error("resource_not_found")]), 404
@@ -49,7 +66,9 @@ def init_app() -> Flask:
                 methods=[resource_endpoint[3]],
             )
 
-    # Spawn database cleaner thread.
+    api.database.ensure_indexes()
+
+    # Spawn database cleaner thread for collections without TTL index.
     cleaner = api.database.Cleaner()
     return app
 
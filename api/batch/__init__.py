@@ -0,0 +1,11 @@
+"""POST /batch runs many API requests in one round trip.
+Session is authenticated only once for all of them."""
+
+from typing import List
+
+from api.batch.service import run
+from api.common.rest import ResourceEndpoint, post
+
+endpoints: List[ResourceEndpoint] = [
+    post('/batch', run),
+]
@@ -0,0 +1,21 @@
+BATCH = {
+    '_type': 'list',
+    'max_elements': 20,
+    '_items': {
+        '_type': 'dict',
+        'required': ['method', 'path'],
+        'method': {
+            '_type': 'enum',
+            'values': ['GET', 'POST', 'PATCH', 'DELETE'],
+        },
+        'path': {
+            '_type': 'str',
+            'min': 1,
+            'max': 2000,
+            'pattern': r'^/',
+        },
+        'body': {
+            '_type': 'any',
+        },
+    },
+}
@@ -0,0 +1,116 @@
+"""Sub-requests are dispatched to the same view functions as normal requests,
+so they go through whole _service_wrapper pipeline (parsing, validation,
+serialization), but session found by POST /batch is reused by require_auth.
+
+GET sub-requests between two writes are independent so they run concurrently.
+Writes run one by one in given order.
+"""
+
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from flask import Flask, current_app
+
+from api.batch import schema
+from api.common import ServiceRequest, ServiceResponse, UserSession, codec
+from api.common.rest import PREAUTHENTICATED_SESSION
+from api.database import monitoring
+from api.errors import api_error
+from api.middlewares import require_auth, validate
+
+# Headers of sub-responses copied to batch response.
+_HEADERS = ['ETag', 'X-Total-Count', 'X-Next-Cursor', 'X-Has-More']
+
+# Errors of sub-requests not matching any view. Key is HTTP code.
+_ROUTING_ERRORS = {404: 'resource_not_found', 405: 'method_not_allowed'}
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('API_BATCH_WORKERS', 4)))
+
+
+def _error(code: int, name: str) -> Dict:
+    return {'status': code, 'headers': {}, 'body': [api_error(name)]}
+
+
+def _dispatch(app: Flask, item: Dict, session_token: str,
+              user_session: UserSession, accept_language: str) -> Dict:
+    if item['path'].split('?')[0].rstrip('/') == '/batch':
+        return _error(422, 'nested_batch_request')
+
+    headers = {'Authorization': 'Bearer ' + session_token}
+    if accept_language:
+        headers['Accept-Language'] = accept_language
+    if 'body' in item:
+        body = {'json': item['body']}
+    else:
+        # Like a client sending empty JSON request eg. POST /quizzes/1/solve.
+        body = {'content_type': 'application/json'}
+    with app.test_request_context(
+            item['path'],
+            method=item['method'],
+            headers=headers,
+            environ_overrides={PREAUTHENTICATED_SESSION: user_session},
+            **body):
+        from flask import request
+        if request.routing_exception:
+            code = getattr(request.routing_exception, 'code', 404)
+            return _error(code, _ROUTING_ERRORS.get(code, 'resource_not_found'))
+        try:
+            response = app.view_functions[request.url_rule.endpoint](
+                **request.view_args)
+        except Exception:
+            # Flask would answer such request with 500, here only the item
+            # fails and other results are still returned.
+            app.log_exception(sys.exc_info())
+            return _error(500, 'internal_error')
+
+    if response.is_streamed or response.mimetype != 'application/json':
+        # Exports and images can't be embedded in JSON and reading a stream
+        # here would keep the whole export in memory.
+        response.close()
+        return _error(422, 'batch_response_not_json')
+    data = response.get_data()
+    return {
+        'status': response.status_code,
+        'headers': {h: response.headers[h]
+                    for h in _HEADERS if h in response.headers},
+        'body': codec.loads(data) if data else None,
+    }
+
+
+@validate(schema.BATCH)
+@require_auth()
+def run(r: ServiceRequest) -> ServiceResponse:
+    app = current_app._get_current_object()  # type: ignore
+    from flask import request
+    accept_language = request.headers.get('Accept-Language')
+
+    def dispatch(item: Dict) -> Dict:
+        return _dispatch(app, item, r.session_token, r.user_session,
+                         accept_language)
+
+    # Commands of reads run by other threads count to this request.
+    stats = monitoring.current()
+
+    def dispatch_read(item: Dict) -> Dict:
+        if stats:
+            monitoring.start(stats)
+        try:
+            return dispatch(item)
+        finally:
+            monitoring.finish()
+
+    results: List[Dict] = []
+    reads: List[Dict] = []
+    for item in r.content + [None]:
+        # Flush pending reads before every write and at the end.
+        if item is None or item['method'] != 'GET':
+            results += list(_executor.map(dispatch_read, reads))
+            reads = []
+            if item is not None:
+                results.append(dispatch(item))
+        else:
+            reads.append(item)
+    return ServiceResponse(200, results)
@@ -1,4 +1,6 @@
 import api.common.schema
+import api.database
+from api.common import CASE_INSENSITIVE
 
 NEW_CATEGORY = {
     '_type': 'dict',
@@ -27,9 +29,22 @@ CATEGORY = {
 
 UPDATE_CATEGORY = api.common.schema.delete_required(NEW_CATEGORY)
 
+# Fields which can be selected with fields= query param.
+CATEGORY_FIELDS = ['_id', 'name', 'parent_id', 'main_parent_id']
+
+api.database.Index('categories', [('name', 1)], collation=CASE_INSENSITIVE)
+
 CATEGORIES_QUERY = {
     '_type': 'dict',
     'required': [],
+    'fields': {
+        '_type': 'list',
+        'max_elements': 20,
+        '_items': {
+            '_type': 'enum',
+            'values': CATEGORY_FIELDS,
+        }
+    },
     'exclude': {
         '_type': 'list',
         'max_elements': 20,
@@ -62,6 +77,14 @@ CATEGORIES_QUERY = {
         '_type': 'int',
         'min': 1,
     },
+    'after': {
+        '_type': 'str',
+        'max': 2000,
+    },
+    'count': {
+        '_type': 'enum',
+        'values': ['exact', 'estimated', 'none'],
+    },
     '_id': {
         '_type': 'list',
         'max_elements': 100,
@@ -88,6 +111,14 @@ CATEGORIES_QUERY = {
 SINGLE_CATEGORY_QUERY = {
     '_type': 'dict',
     'required': [],
+    'fields': {
+        '_type': 'list',
+        'max_elements': 20,
+        '_items': {
+            '_type': 'enum',
+            'values': CATEGORY_FIELDS,
+        }
+    },
     'exclude': {
         '_type': 'list',
         'max_elements': 20,
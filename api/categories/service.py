@@ -14,9 +14,11 @@ from typing import List
 import api.categories.schema as schema
 from api import database
 from api.common import ServiceRequest, ServiceResponse
-from api.middlewares import require_auth, validate
+from api.middlewares import require_auth, validate, versioned
 
 database.Embed('category', 'category_id', 'categories')
+database.versions.track('categories')
+database.doc_cache.enable('categories')
 # NOTE: associate_categories embed is after get_categories_list function
 
 
@@ -67,6 +69,7 @@ def update(r: ServiceRequest, category_id: int) -> ServiceResponse:
 
 
 @require_auth()
+@versioned('categories')
 def get(r: ServiceRequest, category_id: int) -> ServiceResponse:
     """Get single category."""
     return database.find_one_by_id('categories', category_id,
@@ -74,6 +77,7 @@ def get(r: ServiceRequest, category_id: int) -> ServiceResponse:
 
 
 @require_auth()
+@versioned('categories')
 def associated_categories(r: ServiceRequest,
                           category_id: int) -> ServiceResponse:
     """Get list of sorterd categories associated with given category.
@@ -132,14 +136,17 @@ def associated_categories_embed(category_id) -> List[dict]:
     return res.response
 
 
-database.FuncEmbed('associated_categories', 'category_id',
-                   associated_categories_embed)
+database.FuncEmbed('associated_categories',
+                   'category_id',
+                   associated_categories_embed,
+                   from_collection='categories')
 
 
 @require_auth()
+@versioned('categories')
 def search(r: ServiceRequest) -> ServiceResponse:
     if r.query.projection:
-        r.query.projection['main_parent_id_id'] = False
+        r.query.hide('main_parent_id_id')
     return database.find_with_query('categories', r.query)
 
 
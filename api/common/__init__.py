@@ -1,2 +1,3 @@
-from api.common.other import FindQuery, Projection, Sort, UserSession
+from api.common.other import (CASE_INSENSITIVE, FindQuery, Projection, Sort,
+                              UserSession, is_inclusive)
 from api.common.service import ServiceCallable, ServiceRequest, ServiceResponse
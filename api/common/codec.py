@@ -0,0 +1,76 @@
+"""JSON codec used by the REST layer.
+
+Picks the fastest available backend (orjson, ujson, stdlib json) once at
+import time. Backend can be forced with API_JSON_BACKEND env var.
+
+Usage:
+document = codec.loads(request.get_data())
+response.data = codec.dumps(document)
+"""
+
+import json
+import os
+import sys
+from typing import Any, Callable, Dict, Union
+
+# Raised by every backend on invalid document.
+# orjson.JSONDecodeError, json.JSONDecodeError and ujson errors are ValueErrors.
+DecodeError = ValueError
+
+
+def _orjson() -> Dict[str, Callable]:
+    import orjson
+
+    def dumps(document: Any) -> bytes:
+        # Non str keys are allowed by stdlib json so keep it that way.
+        return orjson.dumps(document, option=orjson.OPT_NON_STR_KEYS)
+
+    return {'loads': orjson.loads, 'dumps': dumps}
+
+
+def _ujson() -> Dict[str, Callable]:
+    import ujson
+
+    def dumps(document: Any) -> str:
+        return ujson.dumps(document, ensure_ascii=False)
+
+    return {'loads': ujson.loads, 'dumps': dumps}
+
+
+def _json() -> Dict[str, Callable]:
+    def dumps(document: Any) -> str:
+        return json.dumps(document, ensure_ascii=False)
+
+    return {'loads': json.loads, 'dumps': dumps}
+
+
+_BACKENDS: Dict[str, Callable[[], Dict[str, Callable]]] = {
+    'orjson': _orjson,
+    'ujson': _ujson,
+    'json': _json,
+}
+
+
+def _load_backend(name: str = None):
+    if name and name not in _BACKENDS:
+        sys.exit(f'Unknown API_JSON_BACKEND {name}!')
+    names = [name] if name else list(_BACKENDS)
+    for n in names:
+        try:
+            return n, _BACKENDS[n]()
+        except ImportError:
+            continue
+    return 'json', _json()
+
+
+backend, _codec = _load_backend(os.environ.get('API_JSON_BACKEND'))
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Parses document. Raises DecodeError when it is invalid."""
+    return _codec['loads'](data)
+
+
+def dumps(document: Any) -> Union[bytes, str]:
+    """Serializes document to UTF-8 JSON (not escaped to ASCII)."""
+    return _codec['dumps'](document)
@@ -0,0 +1,110 @@
+"""Accept-Encoding negotiation and compression of responses.
+
+Brotli is used when brotli package is installed and client accepts it,
+otherwise gzip. Compressed bodies of responses with ETag are kept in LRU cache,
+so hot payloads (eg. quiz or categories) are not compressed on every hit.
+"""
+
+import gzip
+import os
+from typing import List, Optional
+
+from flask import Response
+
+from api.common import conditional, formats
+from api.common.lru import LRUCache
+
+try:
+    import brotli  # type: ignore
+except ImportError:
+    brotli = None
+
+MIN_SIZE: int = int(os.environ.get('API_COMPRESSION_MIN_SIZE', 1024))
+GZIP_LEVEL: int = int(os.environ.get('API_COMPRESSION_LEVEL', 6))
+BROTLI_QUALITY: int = int(os.environ.get('API_BROTLI_QUALITY', 5))
+
+COMPRESSIBLE = set(formats.SUPPORTED)
+
+# Key is (etag, encoding), value is compressed body.
+_compressed = LRUCache('compressed_responses',
+                       int(os.environ.get('API_COMPRESSION_CACHE_SIZE', 256)))
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """Returns best supported encoding accepted by client or None."""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        q = 1.0
+        if params.strip().startswith('q='):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+
+    supported = ['br', 'gzip'] if brotli else ['gzip']
+    candidates = [
+        c for c in supported if accepted.get(c, accepted.get('*', 0)) > 0
+    ]
+    if not candidates:
+        return None
+    # Prefer highest q, on tie the order from supported list.
+    return max(candidates,
+               key=lambda c:
+               (accepted.get(c, accepted.get('*', 0)), -supported.index(c)))
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, GZIP_LEVEL)
+
+
+def compress_response(response: Response,
+                      accept_encoding: Optional[str]) -> Response:
+    if response.mimetype not in COMPRESSIBLE or response.is_streamed:
+        return response
+    response.vary.add('Accept-Encoding')
+    if response.status_code in (204, 304) or 'Content-Encoding' in response.headers:
+        return response
+
+    data = response.get_data()
+    if len(data) < MIN_SIZE:
+        return response
+    encoding = negotiate(accept_encoding)
+    if not encoding:
+        return response
+
+    etag = response.headers.get('ETag')
+    compressed = _compressed.get((etag, encoding)) if etag else None
+    if compressed is None:
+        compressed = compress(data, encoding)
+        if etag:
+            _compressed.set((etag, encoding), compressed)
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    if etag:
+        # Representations with different encodings need different strong tags.
+        response.headers['ETag'] = conditional.encoded_etag(etag, encoding)
+    return response
+
+
+def not_modified(response: Response, etag: str, if_none_match: List[str],
+                 accept_encoding: Optional[str]) -> Response:
+    """Makes response 304 with ETag and Vary the 200 would have. ETag is the
+    encoded one when client has compressed representation in encoding
+    negotiated now, so caches don't mix variants."""
+    response.status_code = 304
+    response.data = b''
+    encoding = negotiate(accept_encoding)
+    encoded = conditional.encoded_etag(etag, encoding) if encoding else None
+    if encoded and conditional.matches(encoded, if_none_match, exact=True):
+        etag = encoded
+    response.headers['ETag'] = etag
+    if response.mimetype in COMPRESSIBLE:
+        response.vary.add('Accept-Encoding')
+    return response
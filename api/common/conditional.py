@@ -0,0 +1,56 @@
+"""Helpers for conditional GET requests (ETag and If-None-Match headers)."""
+
+import hashlib
+from typing import List, Optional, Union
+
+# Suffixes added to ETags of compressed representations.
+_ENCODINGS = ('gzip', 'br')
+
+
+def content_etag(data: Union[bytes, str]) -> str:
+    """Strong ETag computed from response body."""
+    if isinstance(data, str):
+        data = data.encode()
+    return '"' + hashlib.blake2b(data, digest_size=16).hexdigest() + '"'
+
+
+def version_etag(*parts) -> str:
+    """Strong ETag computed from anything which identifies response content
+    eg. collections versions, role and url."""
+    key = '|'.join(str(p) for p in parts).encode()
+    return '"v' + hashlib.blake2b(key, digest_size=16).hexdigest() + '"'
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """ETag of compressed representation eg. '"abc"' -> '"abc-gzip"'."""
+    return etag[:-1] + '-' + encoding + '"'
+
+
+def _strip_encoding(etag: str) -> str:
+    for encoding in _ENCODINGS:
+        suffix = '-' + encoding + '"'
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+
+def parse_if_none_match(header: Optional[str]) -> List[str]:
+    if not header:
+        return []
+    return [tag.strip() for tag in header.split(',') if tag.strip()]
+
+
+def matches(etag: Optional[str],
+            if_none_match: Optional[List[str]],
+            exact: bool = False) -> bool:
+    """If-None-Match uses weak comparison so W/ prefix is ignored. Tags of
+    compressed representations match their plain ETag, unless exact."""
+    if not etag or not if_none_match:
+        return False
+    for tag in if_none_match:
+        tag = tag.replace('W/', '', 1)
+        if not exact and (tag == '*' or _strip_encoding(tag) == etag):
+            return True
+        if tag == etag:
+            return True
+    return False
@@ -0,0 +1,113 @@
+"""Representations of JSON-shaped documents (Accept and Content-Type).
+
+JSON is always available. MessagePack and CBOR are binary formats with the
+same data model, smaller payloads and cheaper encoding. They are used only
+when msgpack or cbor2 package is installed and client asks for them:
+
+GET /questions
+Accept: application/msgpack
+
+POST /quizzes
+Content-Type: application/msgpack
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from api.common import codec
+
+try:
+    import msgpack  # type: ignore
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2  # type: ignore
+except ImportError:
+    cbor2 = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+CBOR = 'application/cbor'
+
+# Raised by every format on invalid document.
+DecodeError = codec.DecodeError
+
+
+def _msgpack() -> Tuple[Callable, Callable]:
+    def loads(data: bytes) -> Any:
+        # Integer keys are allowed like in JSON documents parsed by codec.
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+    def dumps(document: Any) -> bytes:
+        return msgpack.packb(document, use_bin_type=True)
+
+    return loads, dumps
+
+
+def _cbor() -> Tuple[Callable, Callable]:
+    def loads(data: bytes) -> Any:
+        try:
+            return cbor2.loads(data)
+        except cbor2.CBORDecodeError as e:
+            # Not a ValueError in every cbor2 version.
+            raise DecodeError(str(e)) from e
+
+    return loads, cbor2.dumps
+
+
+# Mimetype: (loads, dumps). Order is preference on tie in Accept header.
+_FORMATS: Dict[str, Tuple[Callable, Callable]] = {JSON: (codec.loads, codec.dumps)}
+if msgpack:
+    _FORMATS[MSGPACK] = _msgpack()
+    # Unofficial but common name.
+    _FORMATS['application/x-msgpack'] = _FORMATS[MSGPACK]
+if cbor2:
+    _FORMATS[CBOR] = _cbor()
+
+SUPPORTED: List[str] = list(_FORMATS)
+
+
+def is_supported(mimetype: Optional[str]) -> bool:
+    return mimetype in _FORMATS
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """Returns best supported mimetype accepted by client.
+    JSON when client accepts anything or nothing that is supported."""
+    if not accept:
+        return JSON
+    accepted = {}
+    for item in accept.split(','):
+        mimetype, _, params = item.strip().partition(';')
+        q = 1.0
+        for param in params.split(';'):
+            if param.strip().startswith('q='):
+                try:
+                    q = float(param.strip()[2:])
+                except ValueError:
+                    q = 0.0
+        accepted[mimetype.strip().lower()] = q
+
+    # Wildcards never select a binary format.
+    candidates = [m for m in SUPPORTED if accepted.get(m, 0) > 0]
+    if not candidates:
+        return JSON
+    best = max(candidates,
+               key=lambda m: (accepted[m], -SUPPORTED.index(m)))
+    wildcard = max(accepted.get('*/*', 0), accepted.get('application/*', 0))
+    return JSON if wildcard > accepted[best] else best
+
+
+def loads(mimetype: str, data: Union[bytes, str]) -> Any:
+    """Parses document. Raises DecodeError when it is invalid."""
+    try:
+        return _FORMATS[mimetype][0](data)
+    except DecodeError:
+        raise
+    except (TypeError, EOFError) as e:
+        # Eg. unhashable map key in msgpack or truncated CBOR document.
+        raise DecodeError(str(e)) from e
+
+
+def dumps(mimetype: str, document: Any) -> Union[bytes, str]:
+    return _FORMATS[mimetype][1](document)
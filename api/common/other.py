@@ -1,11 +1,21 @@
+import copy
 from dataclasses import dataclass
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 from typing_extensions import Literal
 
 Sort = Dict[str, Literal[-1, 1]]
 Projection = Dict[str, bool]
 
+# Collation for case insensitive string matching.
+# Indexes used by such queries must be created with the same collation.
+CASE_INSENSITIVE: Dict[str, Any] = {'locale': 'pl', 'strength': 2}
+
+
+def is_inclusive(projection: Optional[Projection]) -> bool:
+    """Inclusive projection returns only given fields, exclusive all but given."""
+    return bool(projection) and any(projection.values())  # type: ignore
+
 
 class FindQuery():
     def __init__(self,
@@ -14,7 +24,10 @@ class FindQuery():
                  sort=None,
                  limit=10,
                  skip=0,
-                 embed=None):
+                 embed=None,
+                 after=None,
+                 count='exact',
+                 collation=None):
         if not _filter:
             self._filter = {}
         else:
@@ -33,6 +46,36 @@ class FindQuery():
             self.embed = None
         self.limit = limit
         self.skip = skip
+        # Keyset pagination cursor. See api.database.pagination.
+        self.after = after
+        # Total count strategy. See api.database.counting.
+        self.count = count
+        self.collation = collation
+
+    def copy(self) -> 'FindQuery':
+        """Returns copy which can be changed without changing this query."""
+        query = copy.copy(self)
+        query._filter = copy.deepcopy(self._filter)
+        query.sort = dict(self.sort)
+        if self.projection:
+            query.projection = dict(self.projection)
+        if self.embed:
+            query.embed = list(self.embed)
+        if self.collation:
+            query.collation = dict(self.collation)
+        return query
+
+    def hide(self, *fields: str):
+        """Makes sure that fields are not returned,
+        whatever projection client asked for."""
+        if is_inclusive(self.projection):
+            for field in fields:
+                self.projection.pop(field, None)
+            return
+        if not self.projection:
+            self.projection = {}
+        for field in fields:
+            self.projection[field] = False
 
 
 @dataclass
@@ -1,28 +1,98 @@
-import json
+import functools
+import os
 import re
 import urllib.parse
 from functools import wraps
-from typing import Callable, Dict, List, Tuple, Union
+from typing import (Callable, Dict, Iterable, Iterator, List, Optional, Tuple,
+                    Union)
 
-from flask import Response
+from flask import Response, stream_with_context
 
 import api.errors
-from api.common.other import FindQuery
+from api.common import codec, compression, conditional, formats
+from api.common.lru import LRUCache
+from api.common.other import CASE_INSENSITIVE, FindQuery
 from api.common.service import ServiceCallable, ServiceRequest, ServiceResponse
+from api.database.connect import secondary_reads
 from api.errors import api_error
-from api.middlewares import check
+from api.middlewares import compile_schema
 
 ResourceEndpoint = Tuple[str, str, Callable, str]
 ResourceEndpoints = List[ResourceEndpoint]
 
 response = Response(mimetype='application/json')
 
+NDJSON = 'application/x-ndjson'
 
+# Default limit of POST and PATCH bodies in bytes. Bigger bodies are rejected
+# with 413 before they are read and parsed.
+MAX_BODY_SIZE = int(os.environ.get('API_MAX_BODY_SIZE', 256 * 1024))
+
+# Parsed and validated GET queries. Key is (view function, query string),
+# value is FindQuery template (never given to services, only its copies)
+# or list of errors.
+_parsed_queries = LRUCache('parsed_queries',
+                           int(os.environ.get('API_QUERY_CACHE_SIZE', 1024)))
+
+# WSGI environ key with UserSession authenticated before request was dispatched
+# eg. by POST /batch for its sub-requests. Clients can't set environ keys.
+PREAUTHENTICATED_SESSION = 'api.user_session'
+
+
+# Filter operators are suffixes of query string keys:
+#   GET /questions?text=abc   - exact match (case insensitive)
+#   GET /questions?text^=abc  - prefix match (case insensitive)
+#   GET /questions?text~=abc  - substring match (case insensitive)
+# Exact and prefix matches use CASE_INSENSITIVE collation, so they can use
+# indexes created with the same collation. Substring match can't use any index.
+_PREFIX = '^'
+_SUBSTRING = '~'
+
+
+@functools.lru_cache(maxsize=1024)
 def _to_regex(element: str) -> re.Pattern:
-    return re.compile(element, re.IGNORECASE)
+    return re.compile(re.escape(element), re.IGNORECASE)
+
+
+def _prefix_range(element: str) -> dict:
+    # U+FFFF has the highest weight in every collation.
+    return {'$gte': element, '$lt': element + '\uffff'}
 
 
-def _map_to_query(query: dict) -> FindQuery:
+def _map_filter(mapped_query: FindQuery, field: str, values,
+                operator: str = None):
+    # Eg. GET /admin/accounts?newsletter=_true_
+    if not isinstance(values, list):
+        mapped_query._filter[field] = values
+        return
+
+    strings = [v for v in values if not isinstance(v, int)]
+    numbers = [v for v in values if isinstance(v, int)]
+    if not strings:
+        mapped_query._filter[field] = {'$in': values}
+    elif operator == _SUBSTRING:
+        mapped_query._filter[field] = {
+            '$in': numbers + [_to_regex(v) for v in strings]
+        }
+    elif operator == _PREFIX:
+        mapped_query.collation = CASE_INSENSITIVE
+        alternatives = [{field: _prefix_range(v)} for v in strings]
+        if numbers:
+            alternatives.append({field: {'$in': numbers}})
+        if len(alternatives) == 1:
+            mapped_query._filter.update(alternatives[0])
+        else:
+            mapped_query._filter.setdefault('$and', []).append(
+                {'$or': alternatives})
+    else:
+        mapped_query.collation = CASE_INSENSITIVE
+        mapped_query._filter[field] = {'$in': values}
+
+
+def _map_to_query(query: dict, operators: Dict[str, str] = None) -> FindQuery:
+    """operators maps filtered field to its operator suffix (see above)."""
+    if not operators:
+        operators = {}
     mapped_query = FindQuery()
     for k, v in query.items():
         if k == 'exclude':
@@ -36,11 +106,11 @@ def _map_to_query(query: dict) -> FindQuery:
             }
 
         # Map filters.
-        if k not in ['exclude', 'sort', 'limit', 'skip', 'embed']:
-            mapped_query._filter[k] = {
-                '$in':
-                [_to_regex(i) if not isinstance(i, int) else i for i in v]
-            }
+        if k not in [
+                'exclude', 'fields', 'sort', 'limit', 'skip', 'embed', 'after',
+                'count'
+        ]:
+            _map_filter(mapped_query, k, v, operators.get(k))
 
         if k == 'embed':
             mapped_query.embed = query['embed']
@@ -48,12 +118,43 @@ def _map_to_query(query: dict) -> FindQuery:
             mapped_query.limit = query['limit']
         if k == 'skip':
             mapped_query.skip = query['skip']
+        if k == 'after':
+            mapped_query.after = query['after']
+        if k == 'count':
+            mapped_query.count = query['count']
+
+    # Inclusive projection eg. GET /quizzes?fields=title&fields=category_id
+    # Only _id can be excluded at the same time.
+    if query.get('fields'):
+        excluded_id = '_id' in query.get('exclude', [])
+        mapped_query.projection = {field: True for field in query['fields']}
+        if excluded_id:
+            mapped_query.projection['_id'] = False
     return mapped_query
 
 
+def _ndjson_lines(documents: Iterable) -> Iterator[bytes]:
+    for document in documents:
+        line = codec.dumps(document)
+        if isinstance(line, str):
+            line = line.encode()
+        yield line + b'\n'
+
+
+def _read_body(request, max_size: int) -> Optional[bytes]:
+    """Returns None when body is bigger than max_size.
+    Never reads more than max_size + 1 bytes, even if Content-Length is missing."""
+    if request.content_length is not None and request.content_length > max_size:
+        return None
+    data = request.stream.read(max_size + 1)
+    return None if len(data) > max_size else data
+
+
 def _parse_service_response(sr: ServiceResponse) -> Response:
     response = Response(mimetype=sr.content_type)
     from flask import request
+    # JSON-shaped documents can be sent as MessagePack or CBOR.
+    document_format = formats.negotiate(request.headers.get('Accept'))
     if sr.errors:
         if not isinstance(sr.errors, list):
             sr.errors = [sr.errors]
@@ -62,23 +163,94 @@ def _parse_service_response(sr: ServiceResponse) -> Response:
                          for e in sr.errors]  # type: ignore
 
         response.status_code = int(str(sr.code)[:3])
-        response.data = json.dumps(sr.errors)
-    elif sr.content_type == 'application/json':
+        response.mimetype = document_format
+        response.vary.add('Accept')
+        response.data = formats.dumps(document_format, sr.errors)
+    elif sr.content_type == NDJSON:
+        # Streamed body, so no ETag or compression. Both would need whole body.
+        return Response(stream_with_context(_ndjson_lines(sr.response)),
+                        status=sr.code,
+                        mimetype=NDJSON)
+    elif sr.code == 304:
+        # Client copy is fresh, service didn't even fetch the data.
+        if sr.content_type == formats.JSON:
+            response.vary.add('Accept')
+        return compression.not_modified(
+            response, sr.etag,
+            conditional.parse_if_none_match(
+                request.headers.get('If-None-Match')),
+            request.headers.get('Accept-Encoding'))
+    elif sr.content_type == formats.JSON:
         response.status_code = sr.code
-        response.data = json.dumps(sr.response, ensure_ascii=False)
+        response.mimetype = document_format
+        response.vary.add('Accept')
+        response.data = formats.dumps(document_format, sr.response)
     else:
         response.status_code = sr.code
         response.data = sr.response
 
+    if request.method == 'GET' and response.status_code == 200:
+        etag = sr.etag or conditional.content_etag(response.get_data())
+        response.headers['ETag'] = etag
+        if_none_match = conditional.parse_if_none_match(
+            request.headers.get('If-None-Match'))
+        if conditional.matches(etag, if_none_match):
+            return compression.not_modified(
+                response, etag, if_none_match,
+                request.headers.get('Accept-Encoding'))
+
     if sr.total_count:
         response.headers['X-Total-Count'] = sr.total_count
-    return response
+    if sr.next_cursor:
+        response.headers['X-Next-Cursor'] = sr.next_cursor
+    if sr.has_more is not None:
+        response.headers['X-Has-More'] = 'true' if sr.has_more else 'false'
+    return compression.compress_response(
+        response, request.headers.get('Accept-Encoding'))
+
+
+def _parse_query(query_string: str,
+                 check_query: Optional[Callable]) -> Union[FindQuery, List]:
+    """Returns FindQuery or list of validation errors."""
+    url_query = dict(urllib.parse.parse_qs(query_string))
+
+    # Strip filter operators, so keys can be validated with schema.
+    operators: Dict[str, str] = {}
+    for k in list(url_query):
+        if k[-1:] in (_PREFIX, _SUBSTRING):
+            operators[k[:-1]] = k[-1]
+            url_query[k[:-1]] = url_query.pop(k)
+
+    query = {}
+    if url_query and check_query:
+        for k, v in url_query.items():
+            if k in ['limit', 'skip'] and v[0].isdigit():
+                query[k] = int(v[0])
+            elif (k in ['limit', 'skip', 'after', 'count']
+                  or isinstance(v, bool)):
+                query[k] = v[0]
+            elif v == ['_true_']:
+                query[k] = True
+            elif v == ['_false_']:
+                query[k] = False
+            else:
+                query[k] = [int(i) if i.isdigit() else i for i in v]
+        errors = check_query(query, 'query')
+        if errors:
+            return errors
+    return _map_to_query(query, operators)
 
 
 def _service_wrapper(func: ServiceCallable,
                      method: str,
                      query_schema: dict = None,
-                     content_type: str = 'application/json') -> Callable:
+                     content_type: str = 'application/json',
+                     max_body_size: int = None,
+                     secondary: bool = False) -> Callable:
+    if max_body_size is None:
+        max_body_size = MAX_BODY_SIZE
+    check_query = compile_schema(query_schema) if query_schema else None
+
     @wraps(func)
     def wrapper(**kwargs):
         from flask import request
@@ -87,60 +259,74 @@ def _service_wrapper(func: ServiceCallable,
             session_token: str = auth_header[7:]
         else:
             session_token = ''
+        user_session = request.environ.get(PREAUTHENTICATED_SESSION, {})
 
         if method in ('post', 'patch'):
-            if request.content_type != content_type:
+            # JSON bodies can be sent as MessagePack or CBOR as well.
+            body_format = request.content_type
+            if body_format != content_type and not (
+                    content_type == formats.JSON
+                    and formats.is_supported(body_format)):
                 return _parse_service_response(
                     ServiceResponse(415,
                                     errors=api_error('unsupported_media_type',
                                                      [content_type])))
 
-            if request.is_json and request.data:
+            body = _read_body(request, max_body_size)
+            if body is None:
+                return _parse_service_response(
+                    ServiceResponse(413,
+                                    errors=api_error('payload_too_large',
+                                                     [max_body_size])))
+
+            if formats.is_supported(body_format) and body:
+                # Parse body only once. request.json would parse it again.
                 try:
-                    json.loads(request.data)
-                except json.JSONDecodeError:
-                    return ServiceResponse(400,
-                                           errors=api_error('invalid_json'))
-                service_request = ServiceRequest(user_session={},
+                    content = formats.loads(body_format, body)
+                # Too deeply nested documents exceed recursion limit of some
+                # parsers.
+                except (formats.DecodeError, RecursionError):
+                    error = ('invalid_json' if body_format == formats.JSON
+                             else 'invalid_document')
+                    return _parse_service_response(
+                        ServiceResponse(400, errors=api_error(error)))
+                service_request = ServiceRequest(user_session=user_session,
                                                  session_token=session_token,
-                                                 content=request.json)
+                                                 content=content)
             else:
-                service_request = ServiceRequest(user_session={},
+                service_request = ServiceRequest(user_session=user_session,
                                                  session_token=session_token,
-                                                 content=request.data)
+                                                 content=body)
 
         elif method == 'get':
-            url_query = dict(
-                urllib.parse.parse_qs(
-                    urllib.parse.urlsplit(request.url).query))
-
-            query = {}
-            if url_query and query_schema:
-                for k, v in url_query.items():
-                    if k in ['limit', 'skip'] and v[0].isdigit():
-                        query[k] = int(v[0])
-                    elif k in ['limit', 'skip'] or isinstance(v, bool):
-                        query[k] = v[0]
-                    elif v == ['_true_']:
-                        query[k] = True
-                    elif v == ['_false_']:
-                        query[k] = False
-                    else:
-                        query[k] = [int(i) if i.isdigit() else i for i in v]
-                errors = check(query, query_schema, 'query')
-                if errors:
-                    return _parse_service_response(
-                        ServiceResponse(422, errors=errors))
-            mapped = _map_to_query(query)
-            service_request = ServiceRequest(content={},
-                                             user_session={},
-                                             session_token=session_token,
-                                             query=mapped)
+            # Query strings repeat a lot, so parsed ones are cached per endpoint.
+            key = (wrapper, request.query_string)
+            parsed = _parsed_queries.get(key)
+            if parsed is None:
+                parsed = _parse_query(
+                    urllib.parse.urlsplit(request.url).query, check_query)
+                _parsed_queries.set(key, parsed)
+            if isinstance(parsed, list):
+                # Errors are changed by _parse_service_response eg. translated.
+                return _parse_service_response(
+                    ServiceResponse(422, errors=[dict(e) for e in parsed]))
+            mapped = parsed.copy()
+            service_request = ServiceRequest(
+                content={},
+                user_session=user_session,
+                session_token=session_token,
+                query=mapped,
+                if_none_match=conditional.parse_if_none_match(
+                    request.headers.get('If-None-Match')))
         elif method == 'delete':
             service_request = ServiceRequest(content={},
-                                             user_session={},
+                                             user_session=user_session,
                                              session_token=session_token)
 
+        if secondary:
+            with secondary_reads():
+                return _parse_service_response(func(service_request,
+                                                    **kwargs))
         return _parse_service_response(func(service_request, **kwargs))
 
     return wrapper
@@ -148,17 +334,25 @@ def _service_wrapper(func: ServiceCallable,
 
 def post(url: str,
          func: ServiceCallable,
-         content_type: str = 'application/json') -> ResourceEndpoint:
+         content_type: str = 'application/json',
+         max_body_size: int = None) -> ResourceEndpoint:
     endpoint = url.replace('/', '_') + 'post'
-    view_func = _service_wrapper(func, 'post', content_type=content_type)
+    view_func = _service_wrapper(func,
+                                 'post',
+                                 content_type=content_type,
+                                 max_body_size=max_body_size)
     return (url, endpoint, view_func, 'POST')
 
 
 def patch(url: str,
           func: ServiceCallable,
-          content_type: str = 'application/json') -> ResourceEndpoint:
+          content_type: str = 'application/json',
+          max_body_size: int = None) -> ResourceEndpoint:
     endpoint = url.replace('/', '_') + 'patch'
-    view_func = _service_wrapper(func, 'patch', content_type=content_type)
+    view_func = _service_wrapper(func,
+                                 'patch',
+                                 content_type=content_type,
+                                 max_body_size=max_body_size)
     return (url, endpoint, view_func, 'PATCH')
 
 
@@ -170,7 +364,14 @@ def delete(url: str, func: ServiceCallable) -> ResourceEndpoint:
 
 def get(url: str,
         func: ServiceCallable,
-        query_schema=None) -> ResourceEndpoint:
+        query_schema=None,
+        secondary_reads: bool = False) -> ResourceEndpoint:
+    """secondary_reads lets listings of endpoint be read from secondaries
+    when DATABASE_READ_PREFERENCE is set. Only for endpoints which can show
+    slightly stale data and don't use version stamps, eg. exports."""
     endpoint = url.replace('/', '_') + 'get'
-    view_func = _service_wrapper(func, 'get', query_schema=query_schema)
+    view_func = _service_wrapper(func,
+                                 'get',
+                                 query_schema=query_schema,
+                                 secondary=secondary_reads)
     return (url, endpoint, view_func, 'GET')
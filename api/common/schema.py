@@ -1,3 +1,5 @@
+from typing import List
+
 from api.middlewares.validator import Schema
 import copy
 
@@ -5,3 +7,11 @@ def delete_required(schema: Schema):
     new_schema = copy.copy(schema)
     new_schema['required'] = []
     return new_schema
+
+
+def delete_keys(schema: Schema, keys: List[str]):
+    new_schema = copy.copy(schema)
+    for key in keys:
+        new_schema.pop(key, None)
+    return new_schema
+
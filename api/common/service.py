@@ -12,11 +12,14 @@ class ServiceRequest:
                  content,
                  user_session: UserSession,
                  session_token: str = '',
-                 query=FindQuery()):
+                 query=FindQuery(),
+                 if_none_match: List[str] = None):
         self.content = content
         self.user_session = user_session
         self.session_token = session_token
         self.query = query
+        # ETags sent by client in If-None-Match header.
+        self.if_none_match = if_none_match or []
 
     def __repr__(self):
         return str(self.__dict__)
@@ -29,12 +32,21 @@ class ServiceResponse:
                  response={},
                  errors: Optional[Union[List[ApiError], ApiError]] = None,
                  total_count: Optional[int] = None,
-                 content_type: str = 'application/json'):
+                 content_type: str = 'application/json',
+                 etag: Optional[str] = None,
+                 next_cursor: Optional[str] = None,
+                 has_more: Optional[bool] = None):
         self.code = code
         self.response = response
         self.errors = errors
         self.total_count = total_count
         self.content_type = content_type
+        # When not set, ETag of GET response is computed from its body.
+        self.etag = etag
+        # Value of after= query param for next page.
+        self.next_cursor = next_cursor
+        # Set only when listing was made without total count (count=none).
+        self.has_more = has_more
 
     def __repr__(self):
         return str(self.__dict__)
@@ -8,7 +8,14 @@ from typing import Optional
 import pymongo
 
 from api.database.embed import embeds_storage, Embed, FuncEmbed
-from api.database.wrappers import (delete_one, find, find_one, find_one_by_id,
-                                   find_with_query, insert_one, update_one)
+from api.database.indexes import indexes_storage, Index, ensure_indexes
+from api.database.wrappers import (bulk_write, delete_many_by_ids, delete_one,
+                                   find, find_one, find_one_by_id,
+                                   find_with_query, insert_many, insert_one,
+                                   stream_with_query, update_many_by_ids,
+                                   update_one)
 from api.database.connect import db
-from api.database.cleaner import Cleaner
+from api.database import doc_cache, monitoring, versions
+from api.database.cleaner import Cleaner, cleaned_collections
+from api.database.ttl import (EXPIRES_AT, expiring, expiring_collections,
+                              with_expiry)
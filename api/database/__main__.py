@@ -0,0 +1,53 @@
+"""Database maintenance commands. Need the same env vars as the app.
+
+python -m api.database indexes          - prints diff of declared and existing
+                                           indexes (+ missing, ~ changed,
+                                           - not declared)
+python -m api.database indexes --apply  - creates missing indexes
+python -m api.database expiry           - sets expires_at of documents in
+                                           expiring collections written
+                                           before it was introduced
+"""
+
+import argparse
+import sys
+
+# Resources declare their indexes when imported.
+import api.app  # noqa: F401
+from api.database import indexes, ttl
+
+
+def _indexes(args: argparse.Namespace) -> int:
+    index_diff = indexes.diff()
+    for line in index_diff.lines():
+        print(line)
+    if args.apply:
+        indexes.create_missing(index_diff)
+        return 0
+    return 1 if index_diff else 0
+
+
+def _expiry(args: argparse.Namespace) -> int:
+    for collection in ttl.expiring_collections:
+        print(f'{collection}: {ttl.migrate(collection)} updated')
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m api.database')
+    commands = parser.add_subparsers(dest='command', required=True)
+    indexes_parser = commands.add_parser('indexes',
+                                         help='Diff of declared indexes.')
+    indexes_parser.add_argument('--apply',
+                                action='store_true',
+                                help='Create missing indexes.')
+    indexes_parser.set_defaults(run=_indexes)
+    expiry_parser = commands.add_parser(
+        'expiry', help='Set expires_at of documents with only exp.')
+    expiry_parser.set_defaults(run=_expiry)
+    args = parser.parse_args()
+    return args.run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,19 +1,26 @@
 import threading
 import time
+from typing import List
 
 from api.database import db
 
+# Collections which opted in for deleting documents with int exp lower than
+# now. Use expiring() instead where TTL index can be used.
+cleaned_collections: List[str] = []
+
 
 class Cleaner:
-    """Deamon for deleting expired entaties from database."""
+    """Deamon for deleting expired entaties from database.
+    Does nothing when no collection opted in."""
     def __init__(self, interval=5 * 60):
         self.interval = interval
 
-        thread = threading.Thread(target=self.run, daemon=True)
-        thread.start()
+        if cleaned_collections:
+            thread = threading.Thread(target=self.run, daemon=True)
+            thread.start()
 
     def run(self):
         while True:
-            for collection in db.list_collection_names():
+            for collection in cleaned_collections:
                 db[collection].delete_many({'exp': {'$lt': int(time.time())}})
-            time.sleep(self.interval)
\ No newline at end of file
+            time.sleep(self.interval)
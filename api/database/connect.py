@@ -1,9 +1,37 @@
+"""Lazy and fork-safe connection to MongoDB.
+
+Client is created on first use in every process, so gunicorn workers never
+use a client made before fork and app starts without waiting for database.
+db and client are proxies to the client of current process.
+
+DATABASE_URI                           - required,
+DATABASE_NAME                          - by default database from DATABASE_URI,
+DATABASE_MAX_POOL_SIZE                 - connections per worker (100),
+DATABASE_MIN_POOL_SIZE                 - (0),
+DATABASE_SERVER_SELECTION_TIMEOUT_MS   - (30000),
+DATABASE_CONNECT_TIMEOUT_MS            - (20000),
+DATABASE_SOCKET_TIMEOUT_MS             - no timeout by default,
+DATABASE_COMPRESSORS                   - eg. zstd,snappy,zlib,
+DATABASE_READ_PREFERENCE               - eg. secondaryPreferred, used by
+                                         listings of endpoints which opt in
+                                         (see secondary_reads()).
+Values in DATABASE_URI options take precedence.
+"""
+
 import atexit
+import contextlib
+import contextvars
 import os
 import sys
-from typing import Tuple
+import threading
+import urllib.parse
+from typing import Any, Callable, Dict, Iterator, Optional, Set
 
 import pymongo
+from pymongo.database import Database
+from pymongo.errors import ConfigurationError
+from pymongo.read_preferences import (make_read_preference,
+                                      read_pref_mode_from_name)
 
 
 def _close(clinet):
@@ -12,28 +40,143 @@ def _close(clinet):
     print("Successfully clossed databse connection!")
 
 
-client: pymongo.MongoClient = None
+_db_uri: str
+try:
+    _db_uri = os.environ["DATABASE_URI"]
+except KeyError as e:
+    sys.exit(f"Env var {e} is not set!")
+
+DATABASE_NAME: Optional[str] = os.environ.get("DATABASE_NAME")
+
+# Env var: (MongoClient option, type).
+_OPTIONS = {
+    "DATABASE_MAX_POOL_SIZE": ("maxPoolSize", int),
+    "DATABASE_MIN_POOL_SIZE": ("minPoolSize", int),
+    "DATABASE_SERVER_SELECTION_TIMEOUT_MS": ("serverSelectionTimeoutMS", int),
+    "DATABASE_CONNECT_TIMEOUT_MS": ("connectTimeoutMS", int),
+    "DATABASE_SOCKET_TIMEOUT_MS": ("socketTimeoutMS", int),
+    "DATABASE_COMPRESSORS": ("compressors", str),
+}
+
 
+def _uri_options() -> Set[str]:
+    """Lowercased names of options given in DATABASE_URI."""
+    query = urllib.parse.urlsplit(_db_uri).query
+    return {name.lower() for name in urllib.parse.parse_qs(query)}
 
-def connect(uri: str) -> Tuple[pymongo.database.Database, pymongo.MongoClient]:
+
+def client_options() -> Dict[str, Any]:
+    """Options from env vars. MongoClient keyword arguments would override
+    the same options in DATABASE_URI, so these are skipped."""
+    in_uri = _uri_options()
+    return {
+        option: cast(os.environ[var])
+        for var, (option, cast) in _OPTIONS.items()
+        if os.environ.get(var) and option.lower() not in in_uri
+    }
+
+
+READ_PREFERENCE: Optional[str] = os.environ.get("DATABASE_READ_PREFERENCE")
+
+_lock = threading.Lock()
+# Process which created client, client, its database and the same database
+# reading with READ_PREFERENCE.
+_pid: Optional[int] = None
+_client: Optional[pymongo.MongoClient] = None
+_database: Optional[Database] = None
+_secondary_database: Optional[Database] = None
+
+_secondary_reads = contextvars.ContextVar("secondary_reads", default=False)
+
+
+def _database_name(client: pymongo.MongoClient) -> str:
+    if DATABASE_NAME:
+        return DATABASE_NAME
+    try:
+        return client.get_default_database().name
+    except ConfigurationError:
+        pass
+    # URIs without database name used before DATABASE_NAME.
+    for name in ("TheSchoolest", "PreExam"):
+        if name in _db_uri:
+            return name
+    raise ConfigurationError("Set DATABASE_NAME or database in DATABASE_URI!")
+
+
+def _connect():
+    global _pid, _client, _database, _secondary_database
     print("Connecting to databse...")
-    client = pymongo.MongoClient(uri)
-    print("Successfully connected to databse!")
+    # Doesn't wait for server, first query does.
+    client = pymongo.MongoClient(_db_uri, **client_options())
+    database = client[_database_name(client)]
+    _secondary_database = (
+        database.with_options(
+            read_preference=make_read_preference(
+                read_pref_mode_from_name(READ_PREFERENCE), None
+            )
+        )
+        if READ_PREFERENCE
+        else database
+    )
+    _client, _database = client, database
     atexit.register(_close, client)
-    if "TheSchoolest" in uri:
-        return client.TheSchoolest, client
-    elif "PreExam" in uri:
-        return client.PreExam, client
-    return None, None
+    # Set last, other threads check it without lock.
+    _pid = os.getpid()
+    print("Successfully connected to databse!")
 
 
-_db_uri: str
-try:
-    _db_uri = os.environ["DATABASE_URI"]
-except KeyError as e:
-    sys.exit(f"Env var {e} is not set!")
+def _ensure_connected():
+    if _pid != os.getpid():
+        with _lock:
+            if _pid != os.getpid():
+                _connect()
+
+
+def get_client() -> pymongo.MongoClient:
+    _ensure_connected()
+    return _client  # type: ignore
+
+
+def get_database() -> Database:
+    _ensure_connected()
+    return _database  # type: ignore
+
+
+def get_reader() -> Database:
+    """Database for listings. Reads from secondaries inside secondary_reads()
+    when DATABASE_READ_PREFERENCE is set."""
+    _ensure_connected()
+    if _secondary_reads.get():
+        return _secondary_database  # type: ignore
+    return _database  # type: ignore
+
+
+@contextlib.contextmanager
+def secondary_reads() -> Iterator[None]:
+    """Listings may be read from secondaries, so they can be behind
+    primary by replication lag. Not for endpoints with ETags from version
+    stamps (see api.middlewares.versioned), as stale body would get new ETag."""
+    token = _secondary_reads.set(True)
+    try:
+        yield
+    finally:
+        _secondary_reads.reset(token)
+
+
+class _Proxy:
+    def __init__(self, target: Callable[[], Any]):
+        object.__setattr__(self, "_target", target)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._target(), name)
+
+    def __getitem__(self, name: str) -> Any:
+        return self._target()[name]
+
+    def __repr__(self) -> str:
+        return f"<lazy {self._target.__name__}>"
+
 
 # Database instance for wrappers or executing queries without them.
-db, client = connect(_db_uri)
-if not client:
-    sys.exit(f"Cannot connect to database!")
\ No newline at end of file
+db: Database = _Proxy(get_database)  # type: ignore
+client: pymongo.MongoClient = _Proxy(get_client)  # type: ignore
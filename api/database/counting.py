@@ -0,0 +1,42 @@
+"""Total count strategies for listings (count= query param).
+
+exact     - count_documents() on every call. Default.
+estimated - estimated_document_count() for unfiltered queries (collection
+            metadata only), otherwise exact count memoized for API_COUNT_TTL
+            seconds per normalized filter.
+none      - no count at all. find() probes for limit + 1 documents instead
+            to tell if there is a next page.
+"""
+
+import os
+import re
+from typing import Any, Callable, Hashable
+
+from api.common.lru import LRUCache
+
+EXACT = 'exact'
+ESTIMATED = 'estimated'
+NONE = 'none'
+
+_memo = LRUCache('counts',
+                 int(os.environ.get('API_COUNT_CACHE_SIZE', 1024)),
+                 ttl=float(os.environ.get('API_COUNT_TTL', 30)))
+
+
+def normalize(value: Any) -> Hashable:
+    """Makes hashable key of filter. Order of dict keys doesn't matter."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, normalize(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize(v) for v in value)
+    if isinstance(value, re.Pattern):
+        return ('$regex', value.pattern, value.flags)
+    return value
+
+
+def memoized(key: Hashable, count: Callable[[], int]) -> int:
+    total_count = _memo.get(key)
+    if total_count is None:
+        total_count = count()
+        _memo.set(key, total_count)
+    return total_count
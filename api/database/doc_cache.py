@@ -0,0 +1,65 @@
+"""Read-through cache of find_one_by_id for collections which are read much
+more often than written. Collections opt in with
+>>> doc_cache.enable('categories')
+
+Entries are keyed by collection, _id and projection, and keep version of
+collection's stamp (see api.database.versions) from before the document was
+read. Every write done by wrappers bumps the stamp, so in the writing worker
+entries are stale at once and in other workers after at most
+API_VERSIONS_TTL seconds. API_DOC_CACHE_TTL limits age of entries in case
+collection is written without wrappers.
+
+Hits, misses and evictions are reported by GET /status as 'documents' cache.
+"""
+
+import copy
+import os
+from typing import Any, Dict, Hashable, Optional, Set
+
+from api.common import Projection
+from api.common.lru import LRUCache
+from api.database import versions
+from api.database.counting import normalize
+
+_cache = LRUCache('documents',
+                  int(os.environ.get('API_DOC_CACHE_SIZE', 4096)),
+                  ttl=float(os.environ.get('API_DOC_CACHE_TTL', 300)))
+
+_enabled: Set[str] = set()
+
+
+def enable(collection: str):
+    """Collection must be written only by wrappers, like tracked ones."""
+    versions.track(collection)
+    _enabled.add(collection)
+
+
+def is_enabled(collection: str) -> bool:
+    return collection in _enabled
+
+
+def _key(collection: str, _id: Any, projection: Projection) -> Hashable:
+    return collection, _id, normalize(projection or None)
+
+
+def get(collection: str, _id: Any,
+        projection: Projection = None) -> Optional[Dict[str, Any]]:
+    """Returns copy of cached document, None when it is missing or stale."""
+    cached = _cache.get(_key(collection, _id, projection))
+    if not cached or cached[0] != versions.get(collection):
+        return None
+    # Services are free to modify documents they get.
+    return copy.deepcopy(cached[1])
+
+
+def store(collection: str, _id: Any, projection: Projection,
+          document: Dict[str, Any], version: int):
+    """version is the one read before document was fetched."""
+    _cache.set(_key(collection, _id, projection),
+               (version, copy.deepcopy(document)))
+
+
+def invalidate(collection: str, _id: Any):
+    """Drops entries of document in this worker. Other workers notice bumped
+    stamp."""
+    _cache.delete_where(lambda key, _: key[0] == collection and key[1] == _id)
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Callable, Dict, NewType
+from typing import Callable, Dict, NewType, Optional
 
 EmbedName = NewType('EmbedName', str)
 
@@ -42,6 +42,8 @@ class FuncEmbed:
     local_filed: str
     func: Callable
     forien_field: str = '_id'
+    # Collection read by func. Used to tell if embeded data has changed.
+    from_collection: Optional[str] = None
 
     def __post_init__(self):
         embeds_storage[self.name] = self
@@ -0,0 +1,92 @@
+"""Integer _ids of new documents, unique across workers.
+
+Last given id of every collection is kept in 'counters' collection. A worker
+reserves a block of API_ID_BLOCK_SIZE ids with one atomic $inc and gives them
+out locally, so most inserts don't need an extra round trip. Ids of a block
+which is not used up (eg. when worker restarts) are skipped, so ids are
+unique and increasing within a worker, but not gapless.
+
+Counter of collection is created once, starting after the biggest existing
+_id.
+"""
+
+import os
+import threading
+from typing import Dict, List, Set, Tuple
+
+import pymongo
+from pymongo.errors import DuplicateKeyError
+
+from api.database.connect import db
+
+BLOCK_SIZE: int = int(os.environ.get('API_ID_BLOCK_SIZE', 20))
+
+_lock = threading.Lock()
+# Collection name -> (next id, last id of reserved block).
+_blocks: Dict[str, Tuple[int, int]] = {}
+_seeded: Set[str] = set()
+
+
+def _biggest_id(collection: str) -> int:
+    # Strings are sorted after numbers.
+    document = db[collection].find_one({'_id': {'$type': 'number'}},
+                                       {'_id': True},
+                                       sort=[('_id', -1)])
+    return document['_id'] if document else 0
+
+
+def _seed(collection: str):
+    """Moves counter past ids already used in collection."""
+    last = _biggest_id(collection)
+    try:
+        db.counters.update_one({'_id': collection},
+                               {'$max': {
+                                   'last': last
+                               }},
+                               upsert=True)
+    except DuplicateKeyError:
+        # Counter was created by other worker at the same time.
+        db.counters.update_one({'_id': collection}, {'$max': {'last': last}})
+
+
+def _reserve(collection: str, size: int) -> Tuple[int, int]:
+    if collection not in _seeded:
+        if not db.counters.find_one({'_id': collection}):
+            _seed(collection)
+        _seeded.add(collection)
+    counter = db.counters.find_one_and_update(
+        {'_id': collection}, {'$inc': {
+            'last': size
+        }},
+        upsert=True,
+        return_document=pymongo.ReturnDocument.AFTER)
+    return counter['last'] - size + 1, counter['last']
+
+
+def next_ids(collection: str, count: int) -> List[int]:
+    """Ids for count documents. Needs at most one round trip."""
+    with _lock:
+        next_id, last = _blocks.get(collection, (1, 0))
+        given = list(range(next_id, min(next_id + count - 1, last) + 1))
+        next_id += len(given)
+        missing = count - len(given)
+        if missing:
+            # Big inserts reserve exactly as many ids as they need.
+            next_id, last = _reserve(collection, max(missing, BLOCK_SIZE))
+            given += range(next_id, next_id + missing)
+            next_id += missing
+        _blocks[collection] = (next_id, last)
+        return given
+
+
+def next_id(collection: str) -> int:
+    return next_ids(collection, 1)[0]
+
+
+def resync(collection: str):
+    """Called when an id turned out to be used already, eg. document was
+    inserted without counters. Drops local block and moves counter past
+    the biggest existing id."""
+    with _lock:
+        _blocks.pop(collection, None)
+        _seed(collection)
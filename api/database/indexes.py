@@ -0,0 +1,154 @@
+"""Indexes declared by resources next to their schemas.
+
+Eg.
+>>> Index('accounts', [('email', 1)], unique=True)
+>>> Index('categories', [('name', 1)], collation=CASE_INSENSITIVE)
+>>> Index('accounts', [('blocked.to', 1)], partial={'blocked': {'$exists': True}})
+
+ensure_indexes() is called when app starts. It creates missing indexes in
+a background thread and reports drift: declared indexes which exist with
+different options and undeclared indexes in managed collections. Those are
+never changed or dropped automatically. Diff can be printed with
+python -m api.database indexes
+"""
+
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import pymongo
+from pymongo.errors import PyMongoError
+
+from api.database.connect import db
+
+# List[Index]
+indexes_storage = []  # type: ignore
+
+
+@dataclass
+class Index:
+    collection: str
+    keys: List[Tuple[str, int]]
+    unique: bool = False
+    collation: Optional[Dict[str, Any]] = None
+    # partialFilterExpression, only documents matching it are indexed.
+    partial: Optional[Dict[str, Any]] = None
+    # expireAfterSeconds, see api.database.ttl.
+    expire_after: Optional[int] = None
+
+    def __post_init__(self):
+        indexes_storage.append(self)
+
+    @property
+    def name(self) -> str:
+        name = '_'.join(f'{k}_{d}' for k, d in self.keys)
+        # Same keys can be indexed with and without collation.
+        return name + '_ci' if self.collation else name
+
+    def options(self) -> Dict[str, Any]:
+        options: Dict[str, Any] = {'name': self.name}
+        if self.unique:
+            options['unique'] = True
+        if self.collation:
+            options['collation'] = self.collation
+        if self.partial:
+            options['partialFilterExpression'] = self.partial
+        if self.expire_after is not None:
+            options['expireAfterSeconds'] = self.expire_after
+        return options
+
+    def to_model(self) -> pymongo.IndexModel:
+        return pymongo.IndexModel(self.keys, **self.options())
+
+    def matches(self, info: Dict[str, Any]) -> bool:
+        """Compares with index_information() entry of existing index."""
+        if [tuple(k) for k in info['key']] != [tuple(k) for k in self.keys]:
+            return False
+        if bool(info.get('unique')) != self.unique:
+            return False
+        if info.get('partialFilterExpression') != self.partial:
+            return False
+        if info.get('expireAfterSeconds') != self.expire_after:
+            return False
+        # Server returns collation with all defaults filled in.
+        collation = info.get('collation')
+        if not self.collation or not collation:
+            return self.collation == collation
+        return all(collation.get(k) == v for k, v in self.collation.items())
+
+
+@dataclass
+class IndexDiff:
+    missing: List[Index] = field(default_factory=list)
+    # Declared indexes which exist with different keys or options.
+    changed: List[Index] = field(default_factory=list)
+    # (collection, name) of indexes which are not declared.
+    extra: List[Tuple[str, str]] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.missing or self.changed or self.extra)
+
+    def lines(self) -> List[str]:
+        lines = [f'+ {i.collection}.{i.name} {i.options()}' for i in self.missing]
+        lines += [
+            f'~ {i.collection}.{i.name} {i.options()}' for i in self.changed
+        ]
+        lines += [f'- {collection}.{name}' for collection, name in self.extra]
+        return lines
+
+
+def _by_collection() -> Dict[str, List[Index]]:
+    by_collection: Dict[str, List[Index]] = {}
+    for index in indexes_storage:
+        by_collection.setdefault(index.collection, []).append(index)
+    return by_collection
+
+
+def diff() -> IndexDiff:
+    """Compares declared indexes with the ones in database."""
+    result = IndexDiff()
+    for collection, indexes in _by_collection().items():
+        existing = db[collection].index_information()
+        for index in indexes:
+            info = existing.pop(index.name, None)
+            if info is None:
+                result.missing.append(index)
+            elif not index.matches(info):
+                result.changed.append(index)
+        result.extra += [(collection, name) for name in existing
+                         if name != '_id_']
+    return result
+
+
+def create_missing(index_diff: IndexDiff):
+    """Creates indexes one by one, so one failing (eg. unique index over
+    duplicates) does not stop the others."""
+    for index in index_diff.missing:
+        try:
+            db[index.collection].create_indexes([index.to_model()])
+        except PyMongoError as e:
+            print(f'Cannot create index {index.collection}.{index.name}: {e}')
+
+
+def reconcile():
+    try:
+        index_diff = diff()
+        create_missing(index_diff)
+    except PyMongoError as e:
+        print(f'Cannot reconcile indexes: {e}')
+        return
+    for index in index_diff.changed:
+        print(f'Index {index.collection}.{index.name} differs from declared '
+              f'{index.options()}, drop it to recreate.')
+    for collection, name in index_diff.extra:
+        print(f'Index {collection}.{name} is not declared.')
+
+
+def ensure_indexes(background: bool = True):
+    """Creates missing indexes and reports drift. Existing ones are left
+    untouched. Building indexes can take a while, so by default it is done
+    in a daemon thread and app starts serving requests at once."""
+    if background:
+        threading.Thread(target=reconcile, daemon=True).start()
+    else:
+        reconcile()
@@ -0,0 +1,274 @@
+"""Counts and times database commands issued by each request.
+
+A pymongo CommandListener attributes every command to the request which is
+being handled by the thread issuing it (see start() and finish(), called by
+api.app). Commands of background threads (cleaner, indexes etc.) are not
+attributed to any request, except GET sub-requests of POST /batch which
+are attributed to the batch. NDJSON exports read most of documents after the
+response is returned, so only their first batch is counted.
+
+API_DB_LOG_REQUESTS=1   - prints a JSON line with stats of every request
+                          which issued a command,
+API_DB_TIMING_HEADER=1  - adds stats to Server-Timing header of responses,
+API_SLOW_COMMAND_MS     - commands taking longer are printed with values
+                          replaced by '?' (100 by default, 0 disables),
+API_SLOW_COMMAND_EXPLAIN=1 - slow queries are explained in background and
+                          printed with stages of winning plan.
+"""
+
+import contextvars
+import os
+import queue
+import threading
+from typing import Any, Dict, List, Optional
+
+from pymongo import monitoring
+
+from api.common import codec
+from api.database.connect import get_client
+
+LOG_REQUESTS: bool = os.environ.get('API_DB_LOG_REQUESTS') == '1'
+TIMING_HEADER: bool = os.environ.get('API_DB_TIMING_HEADER') == '1'
+SLOW_COMMAND_MS: float = float(os.environ.get('API_SLOW_COMMAND_MS', 100))
+EXPLAIN: bool = os.environ.get('API_SLOW_COMMAND_EXPLAIN') == '1'
+
+# Commands which can be explained. Other slow commands are only printed.
+EXPLAINABLE = ('find', 'aggregate', 'count', 'distinct', 'findAndModify',
+               'update', 'delete')
+
+# Batches of documents sent by bulk writes, only the first one is shown.
+_PAYLOADS = ('documents', 'updates', 'deletes')
+
+# Fields which name collections or fields, not values.
+_NAMES = ('from', 'localField', 'foreignField', 'as')
+
+# Fields added by driver, not part of command itself.
+_DRIVER_FIELDS = ('lsid', 'txnNumber', '$db', '$clusterTime',
+                  '$readPreference', 'readConcern', 'writeConcern',
+                  'apiVersion')
+
+
+class RequestStats:
+    """Commands of single request."""
+    def __init__(self):
+        self.commands = 0
+        self.duration_ms = 0.0
+        # Name, collection and duration of the slowest command.
+        self.slowest: Optional[Dict[str, Any]] = None
+        # Sub-requests of POST /batch add commands from many threads.
+        self._lock = threading.Lock()
+
+    def add(self, command: str, collection: Optional[str],
+            duration_ms: float):
+        with self._lock:
+            self.commands += 1
+            self.duration_ms += duration_ms
+            if not self.slowest or duration_ms > self.slowest['duration_ms']:
+                self.slowest = {
+                    'command': command,
+                    'collection': collection,
+                    'duration_ms': round(duration_ms, 2)
+                }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'commands': self.commands,
+            'duration_ms': round(self.duration_ms, 2),
+            'slowest': self.slowest
+        }
+
+    def server_timing(self) -> str:
+        """Value of Server-Timing header."""
+        desc = f'{self.commands} commands'
+        if self.slowest:
+            desc += (f', slowest {self.slowest["command"]} '
+                     f'{self.slowest["collection"]} '
+                     f'{self.slowest["duration_ms"]}ms')
+        return f'db;dur={self.duration_ms:.2f};desc="{desc}"'
+
+
+_current: 'contextvars.ContextVar[Optional[RequestStats]]' = \
+    contextvars.ContextVar('request_stats', default=None)
+
+
+def start(stats: RequestStats = None) -> RequestStats:
+    """Starts counting commands of current request. Given stats are shared
+    with other thread eg. by sub-requests of POST /batch."""
+    stats = stats or RequestStats()
+    _current.set(stats)
+    return stats
+
+
+def current() -> Optional[RequestStats]:
+    return _current.get()
+
+
+def finish() -> Optional[RequestStats]:
+    """Stops counting and returns stats of current request."""
+    stats = _current.get()
+    _current.set(None)
+    return stats
+
+
+def log_request(method: str, path: str, status: int, stats: RequestStats):
+    if LOG_REQUESTS and stats.commands:
+        _print({
+            'event': 'request',
+            'method': method,
+            'path': path,
+            'status': status,
+            **stats.to_dict()
+        })
+
+
+def _print(document: Dict[str, Any]):
+    line = codec.dumps(document)
+    print(line.decode() if isinstance(line, bytes) else line, flush=True)
+
+
+def redact(value: Any) -> Any:
+    """Shape of command or its part with every value replaced by '?'."""
+    if isinstance(value, dict):
+        return {
+            k: v if k in _NAMES and isinstance(v, str) else
+            redact(v[:1] if k in _PAYLOADS else v)
+            for k, v in value.items() if k not in _DRIVER_FIELDS
+        }
+    if isinstance(value, (list, tuple)):
+        shapes = [redact(v) for v in value]
+        # Eg. values of $in differ only in values.
+        if all(s == '?' for s in shapes):
+            return ['?'] if shapes else []
+        return shapes
+    return '?'
+
+
+def shape(command: Dict[str, Any]) -> Dict[str, Any]:
+    """Redacted command with name of collection kept."""
+    name = next(iter(command), None)
+    redacted = redact(command)
+    if name is not None and isinstance(command[name], str):
+        redacted[name] = command[name]
+    return redacted
+
+
+def _plan_stages(explained: Any) -> List[str]:
+    """Stages of winning plans eg. ['FETCH', 'IXSCAN category_id_1']. Index
+    bounds are left out, they contain filtered values."""
+    stages: List[str] = []
+
+    def walk_plan(plan: Dict[str, Any]):
+        stage = plan.get('stage', '?')
+        if plan.get('indexName'):
+            stage += f' {plan["indexName"]}'
+        stages.append(stage)
+        for child in plan.get('inputStages', []) + [plan.get('inputStage')]:
+            if isinstance(child, dict):
+                walk_plan(child)
+
+    def find_plans(value: Any):
+        if isinstance(value, dict):
+            for k, v in value.items():
+                if k == 'winningPlan' and isinstance(v, dict):
+                    walk_plan(v)
+                else:
+                    find_plans(v)
+        elif isinstance(value, list):
+            for v in value:
+                find_plans(v)
+
+    find_plans(explained)
+    return stages
+
+
+_explains: 'queue.Queue[Dict[str, Any]]' = queue.Queue(maxsize=64)
+_explainer: Optional[threading.Thread] = None
+_explainer_lock = threading.Lock()
+
+
+def _explain_forever():
+    while True:
+        slow = _explains.get()
+        command = {
+            k: v
+            for k, v in slow.pop('raw').items() if k not in _DRIVER_FIELDS
+        }
+        try:
+            explained = get_client()[slow['database']].command(
+                'explain', command, verbosity='queryPlanner')
+            slow['plan'] = _plan_stages(explained)
+        except Exception as e:
+            slow['plan_error'] = str(e)
+        del slow['database']
+        _print(slow)
+
+
+def _queue_explain(slow: Dict[str, Any]):
+    global _explainer
+    with _explainer_lock:
+        if not _explainer:
+            _explainer = threading.Thread(target=_explain_forever, daemon=True)
+            _explainer.start()
+    try:
+        _explains.put_nowait(slow)
+    except queue.Full:
+        # Explains lag behind, the slow command is printed without plan.
+        del slow['raw'], slow['database']
+        _print(slow)
+
+
+class _Listener(monitoring.CommandListener):
+    """Called by pymongo in the thread which issued command."""
+    def started(self, event: monitoring.CommandStartedEvent):
+        stats = _current.get()
+        if stats is None and not SLOW_COMMAND_MS:
+            return
+        command = event.command
+        collection = command.get(event.command_name)
+        if not isinstance(collection, str):
+            # getMore names collection in separate field.
+            collection = command.get('collection')
+        entry = {
+            'collection': collection if isinstance(collection, str) else None
+        }
+        if SLOW_COMMAND_MS:
+            # Kept until command finishes, it may turn out to be slow.
+            entry['command'] = command
+            entry['database'] = event.database_name
+        _pending[event.request_id] = entry
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._finished(event)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._finished(event)
+
+    def _finished(self, event):
+        entry = _pending.pop(event.request_id, None)
+        if entry is None:
+            return
+        duration_ms = event.duration_micros / 1000
+        stats = _current.get()
+        if stats is not None:
+            stats.add(event.command_name, entry['collection'], duration_ms)
+        if SLOW_COMMAND_MS and duration_ms >= SLOW_COMMAND_MS:
+            slow = {
+                'event': 'slow_command',
+                'duration_ms': round(duration_ms, 2),
+                'command': shape(entry['command'])
+            }
+            if EXPLAIN and event.command_name in EXPLAINABLE:
+                slow['raw'] = entry['command']
+                slow['database'] = entry['database']
+                _queue_explain(slow)
+            else:
+                _print(slow)
+
+
+# Request id of started command -> what is needed when it finishes. Request
+# ids are random, so one dict serves every thread.
+_pending: Dict[int, Dict[str, Any]] = {}
+
+# Must be registered before client is created, it happens on first query
+# (see api.database.connect).
+monitoring.register(_Listener())
@@ -0,0 +1,116 @@
+"""Keyset (cursor) pagination.
+
+Cursor is opaque for clients. It is base64 of sort keys and values of the last
+document on a page eg. GET /questions?sort=-created_at&after=eyJrIjpb...
+Next page is found with filter seeking after those values, so database can walk
+an index instead of skipping documents.
+
+_id is always added as the last sort key so every document has unique position.
+"""
+
+import base64
+from typing import Any, Dict, List, Optional, Tuple
+
+from api.common import Projection, Sort, codec, is_inclusive
+
+
+def with_tiebreaker(sort: Optional[Sort]) -> Sort:
+    sort = dict(sort) if sort else {}
+    if '_id' not in sort:
+        sort['_id'] = 1
+    return sort
+
+
+def _get_path(document: Dict, path: str) -> Any:
+    value: Any = document
+    for key in path.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def encode_cursor(document: Dict, sort: Sort) -> str:
+    cursor = {
+        'k': list(sort.keys()),
+        'v': [_get_path(document, key) for key in sort],
+    }
+    data = codec.dumps(cursor)
+    if isinstance(data, str):
+        data = data.encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, sort: Sort) -> List[Any]:
+    """Returns sort values stored in cursor.
+    Raises ValueError when cursor is malformed or was made for diffrent sort."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        decoded = codec.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError('Malformed cursor') from e
+    if (not isinstance(decoded, dict) or decoded.get('k') != list(sort.keys())
+            or not isinstance(decoded.get('v'), list)
+            or len(decoded['v']) != len(sort)):
+        raise ValueError('Cursor does not match sort')
+    return decoded['v']
+
+
+def _after(key: str, direction: int, value: Any) -> Optional[Dict]:
+    """Filter for values placed after given value in sort order.
+    Missing fields and nulls are first in ascending order and last in descending."""
+    if direction == 1:
+        if value is None:
+            return {key: {'$ne': None}}
+        return {key: {'$gt': value}}
+    if value is None:
+        return None
+    return {'$or': [{key: {'$lt': value}}, {key: None}]}
+
+
+def seek_filter(sort: Sort, values: List[Any]) -> Dict:
+    """(k1 after v1) or (k1 == v1 and k2 after v2) or ..."""
+    branches = []
+    equal: Dict[str, Any] = {}
+    for (key, direction), value in zip(sort.items(), values):
+        after = _after(key, direction, value)
+        if after:
+            branches.append({'$and': [equal, after]} if equal else after)
+        equal = dict(equal)
+        equal[key] = value
+    # Every branch is empty only when cursor points to the very last position.
+    return {'$or': branches} if branches else {'_id': {'$in': []}}
+
+
+def ensure_fields(projection: Optional[Projection],
+                  fields: List[str]) -> Tuple[Optional[Projection], List[str]]:
+    """Makes sure that projection returns fields needed for cursor.
+    Returns new projection and fields which have to be stripped from result."""
+    if not projection:
+        return projection, []
+    projection = dict(projection)
+    hidden: List[str] = []
+    inclusive = is_inclusive(projection)
+    for field in fields:
+        if field == '_id':
+            if projection.get('_id') is False:
+                del projection['_id']
+                hidden.append('_id')
+        elif inclusive and not projection.get(field):
+            projection[field] = True
+            hidden.append(field)
+        elif not inclusive and projection.get(field) is False:
+            del projection[field]
+            hidden.append(field)
+    return projection, hidden
+
+
+def strip_fields(documents: List[Dict], fields: List[str]):
+    for document in documents:
+        for field in fields:
+            keys = field.split('.')
+            parent = document
+            for key in keys[:-1]:
+                parent = parent.get(key) if isinstance(parent, dict) else None
+            if isinstance(parent, dict):
+                parent.pop(keys[-1], None)
@@ -0,0 +1,184 @@
+"""Builds aggregation pipeline used by find() when documents are embeded.
+
+Stages are ordered so that database does as little work as possible:
+
+1. $match on fields of collection itself, so it can use an index,
+2. $lookups of embeds which are filtered or sorted on, and $match on them,
+3. $sort, $skip and $limit, which database merges into top-k sort,
+4. $lookups of remaining embeds and projections, done only for one page.
+
+Eg. GET /questions?category.name=Fizyka&embed=author&sort=-created_at
+>>> plan({'category.name': 'Fizyka'}, {'created_at': -1, '_id': 1}, 0, 10,
+...      [category, author], keep_embeds=True)
+[{'$lookup': category}, {'$match': {'category.name': 'Fizyka'}},
+ {'$sort': ...}, {'$skip': 0}, {'$limit': 10}, {'$lookup': author}, ...]
+
+With count=True page and total count are computed in one round trip by
+$facet, see unpack(). Stages 3 and 4 are then run in its page branch, so
+total count is not sorted.
+"""
+
+from typing import Any, Dict, List, Tuple
+
+from api.common import Projection, Sort, is_inclusive
+from api.database.embed import Embed, FuncEmbed
+
+Filter = Dict[str, Any]
+Stage = Dict[str, Any]
+
+
+def _conjuncts(_filter: Filter) -> List[Filter]:
+    """Splits filter into parts which all have to match. Top level $and is
+    flattened, other operators are kept whole."""
+    conjuncts: List[Filter] = []
+    for k, v in _filter.items():
+        if k == '$and':
+            for sub_filter in v:
+                conjuncts += _conjuncts(sub_filter)
+        else:
+            conjuncts.append({k: v})
+    return conjuncts
+
+
+def filter_fields(_filter: Filter) -> List[str]:
+    """Names of fields used in filter, also these nested in $and/$or."""
+    fields: List[str] = []
+    for k, v in _filter.items():
+        if k in ('$and', '$or', '$nor'):
+            for sub_filter in v:
+                fields += filter_fields(sub_filter)
+        elif not k.startswith('$'):
+            fields.append(k)
+    return fields
+
+
+def _embeds_used(fields: List[str], embeds: List[Embed]) -> List[Embed]:
+    prefixes = {f.split('.')[0] for f in fields}
+    return [e for e in embeds if e.name in prefixes]
+
+
+def _match(conjuncts: List[Filter]) -> List[Stage]:
+    if not conjuncts:
+        return []
+    if len(conjuncts) == 1:
+        return [{'$match': conjuncts[0]}]
+    return [{'$match': {'$and': conjuncts}}]
+
+
+def split_filter(_filter: Filter,
+                 embeds: List[Embed]) -> Tuple[List[Filter], List[Filter]]:
+    """Returns parts of filter which can be matched before lookups and ones
+    which need embeded documents."""
+    early: List[Filter] = []
+    late: List[Filter] = []
+    for conjunct in _conjuncts(_filter):
+        if _embeds_used(filter_fields(conjunct), embeds):
+            late.append(conjunct)
+        else:
+            early.append(conjunct)
+    return early, late
+
+
+def _unique(embeds: List[Embed]) -> List[Embed]:
+    unique: List[Embed] = []
+    for e in embeds:
+        if e not in unique:
+            unique.append(e)
+    return unique
+
+
+def filter_stages(_filter: Filter, sort: Sort,
+                  embeds: List[Embed]) -> Tuple[List[Stage], List[Embed]]:
+    """Stages selecting documents. Returns them and embeds looked up there."""
+    early, late = split_filter(_filter, embeds)
+    needed = _embeds_used(
+        [f for c in late for f in filter_fields(c)] + list(sort), embeds)
+    stages = _match(early)
+    stages += [{'$lookup': e.to_query()} for e in needed]
+    stages += _match(late)
+    return stages, needed
+
+
+def plan(_filter: Filter,
+         sort: Sort,
+         skip: int,
+         limit: int,
+         embeds: List[Embed],
+         projection: Projection = None,
+         func_embeds: List[FuncEmbed] = None,
+         keep_embeds: bool = True,
+         count: bool = False) -> List[Stage]:
+    """keep_embeds is False when embeds are only filtered on, then they are
+    removed from documents."""
+    embeds = _unique(embeds)
+    func_embeds = func_embeds or []
+    stages, needed = filter_stages(_filter, sort, embeds)
+
+    page: List[Stage] = [{'$skip': skip}, {'$limit': limit}]
+    page += [{'$lookup': e.to_query()} for e in embeds if e not in needed]
+
+    if projection:
+        projection = dict(projection)
+        # Inclusive projection would drop embeded documents and fields
+        # which FuncEmbeds need.
+        if is_inclusive(projection):
+            for e in embeds:
+                # Paths inside embeded document would conflict with it.
+                for key in [k for k in projection if k.startswith(f'{e.name}.')]:
+                    del projection[key]
+                projection[e.name] = True
+            for fe in func_embeds:
+                projection[fe.local_filed] = True
+        page.append({'$project': projection})
+
+    # When we embed we don't want local_fields to appear.
+    # FuncEmbeds need their local_fields and delete them by themselves.
+    if embeds and not func_embeds:
+        page.append({'$project': {e.local_filed: False for e in embeds}})
+
+    # Unwind embeded fields because they appear as array.
+    for e in embeds:
+        if not e.is_array:
+            page.append({
+                '$unwind': {
+                    'path': f'${e.name}',
+                    'preserveNullAndEmptyArrays': True
+                }
+            })
+
+    if not keep_embeds and embeds:
+        page.append({'$project': {e.name: False for e in embeds}})
+
+    # $sort is kept right before $skip and $limit, so database sorts only
+    # top skip + limit documents. In $facet it is a part of page only, total
+    # doesn't need documents sorted.
+    page.insert(0, {'$sort': sort})
+    if count:
+        stages.append({
+            '$facet': {
+                'page': page,
+                'total': [{
+                    '$count': 'total_count'
+                }]
+            }
+        })
+    else:
+        stages += page
+    return stages
+
+
+def count_pipeline(_filter: Filter, embeds: List[Embed]) -> List[Stage]:
+    stages, _ = filter_stages(_filter, {}, _unique(embeds))
+    return stages + [{'$count': 'total_count'}]
+
+
+def unpack(result: List[Dict]) -> Tuple[List[Dict], int]:
+    """Returns page and total count from result of plan(count=True)."""
+    facet = result[0] if result else {}
+    total = facet.get('total')
+    return facet.get('page', []), total[0]['total_count'] if total else 0
+
+
+def total_count(result: List[Dict]) -> int:
+    """Returns total count from result of count_pipeline()."""
+    return result[0]['total_count'] if result else 0
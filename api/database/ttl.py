@@ -0,0 +1,59 @@
+"""Collections with documents removed by MongoDB TTL monitor.
+
+Documents of such collections keep int exp used by services and get
+expires_at date from it, because TTL index works only on dates. Eg.
+>>> expiring('session_tokens')
+>>> insert_one('session_tokens', with_expiry({'token': token, 'exp': exp}))
+
+Monitor runs once a minute, so services still have to check exp. Documents
+written before expires_at was introduced are converted by
+python -m api.database expiry
+"""
+
+import datetime
+from typing import Any, Dict, List
+
+from api.database.connect import db
+from api.database.indexes import Index
+
+EXPIRES_AT = 'expires_at'
+
+expiring_collections: List[str] = []
+
+
+def expiring(collection: str) -> Index:
+    expiring_collections.append(collection)
+    return Index(collection, [(EXPIRES_AT, 1)], expire_after=0)
+
+
+def expires_at(exp: int) -> datetime.datetime:
+    # Dates are stored by MongoDB in UTC.
+    return datetime.datetime.utcfromtimestamp(exp)
+
+
+def with_expiry(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns copy of document with expires_at set from exp."""
+    return {**document, EXPIRES_AT: expires_at(document['exp'])}
+
+
+def migrate(collection: str) -> int:
+    """Sets expires_at of documents which have only exp.
+    Returns number of updated documents."""
+    result = db[collection].update_many(
+        {
+            EXPIRES_AT: {
+                '$exists': False
+            },
+            'exp': {
+                '$type': 'number'
+            }
+        }, [{
+            '$set': {
+                EXPIRES_AT: {
+                    '$toDate': {
+                        '$multiply': ['$exp', 1000]
+                    }
+                }
+            }
+        }])
+    return result.modified_count
@@ -0,0 +1,58 @@
+"""Per collection version stamps.
+
+Every write done by wrappers to a tracked collection bumps its counter
+in 'versions' collection. Readers get a version from in-process copy which is
+refreshed from database at most once per API_VERSIONS_TTL seconds, so
+a write made by other worker is visible after at most that time.
+
+Only collections which are written exclusively by wrappers should be tracked.
+Eg.
+>>> versions.track('categories')
+"""
+
+import os
+import time
+from typing import Dict, Set, Tuple
+
+import pymongo
+
+from api.database.connect import db
+
+TTL: float = float(os.environ.get('API_VERSIONS_TTL', 1))
+
+_tracked: Set[str] = set()
+# Collection name -> (version, monotonic time of fetch).
+_local: Dict[str, Tuple[int, float]] = {}
+
+
+def track(collection: str):
+    _tracked.add(collection)
+
+
+def is_tracked(collection: str) -> bool:
+    return collection in _tracked
+
+
+def get(collection: str) -> int:
+    cached = _local.get(collection)
+    now = time.monotonic()
+    if cached and now - cached[1] < TTL:
+        return cached[0]
+
+    document = db.versions.find_one({'_id': collection})
+    version = document['version'] if document else 0
+    _local[collection] = (version, now)
+    return version
+
+
+def bump(collection: str):
+    """Called after every write to collection. Does nothing for not tracked ones."""
+    if collection not in _tracked:
+        return
+    document = db.versions.find_one_and_update(
+        {'_id': collection}, {'$inc': {
+            'version': 1
+        }},
+        upsert=True,
+        return_document=pymongo.ReturnDocument.AFTER)
+    _local[collection] = (document['version'], time.monotonic())
@@ -1,17 +1,34 @@
 """Wraps some of pymongo collection methods to return them as ServiceResponse.
 It is realy useful in not complex resources as questions.
 """
-from typing import Any, Dict, List
-
-from api import api_error
-from api.common import FindQuery, Projection, ServiceResponse, Sort
-from api.database.connect import db
+import os
+from typing import (Any, Callable, Dict, Iterator, List, Optional, Tuple,
+                    Union)
+
+from pymongo import DeleteOne, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from api import ApiError, api_error
+from api.common import (FindQuery, Projection, ServiceResponse, Sort,
+                        is_inclusive)
+from api.database import (counting, doc_cache, ids, pagination, planner,
+                          versions)
+from api.database.connect import db, get_reader
 from api.database.embed import Embed, FuncEmbed, embeds_storage
+from api.database.planner import filter_fields
 
 Filter = Dict[str, Any]
 
-# Store data
-id_cache: Dict[str, int] = {}
+EXPORT_BATCH_SIZE: int = int(os.environ.get('API_EXPORT_BATCH_SIZE', 500))
+
+# Attempts of insert_one when generated _id is taken.
+ID_RETRIES = 3
+
+# Operations sent in one bulk write by bulk wrappers.
+BULK_CHUNK_SIZE: int = int(os.environ.get('API_BULK_CHUNK_SIZE', 1000))
+
+# pymongo write operation eg. InsertOne, UpdateOne, DeleteMany.
+WriteOperation = Union[InsertOne, UpdateOne, DeleteOne, Any]
 
 
 def _parse_sort(sort: Sort):
@@ -24,37 +41,46 @@ def find(collection: str,
          sort: Sort = None,
          skip: int = 0,
          limit: int = 10,
-         embed: List[str] = None) -> ServiceResponse:
+         embed: List[str] = None,
+         after: str = None,
+         count: str = counting.EXACT,
+         collation: Dict[str, Any] = None) -> ServiceResponse:
     """Basic find method.
-       Used for wrapping by other functions eg. find_one, find_with_query etc."""
+       Used for wrapping by other functions eg. find_one, find_with_query etc.
+
+       after is a cursor from X-Next-Cursor header of previous page.
+       When it is given skip is ignored.
+       count is one of strategies from api.database.counting.
+       collation is needed by case insensitive filters (see CASE_INSENSITIVE).
+       Inside connect.secondary_reads() documents may come from secondaries."""
+    reader = get_reader()
+    sort = pagination.with_tiebreaker(sort)
+    page_filter = _filter
+    if after:
+        try:
+            values = pagination.decode_cursor(after, sort)
+        except ValueError:
+            return ServiceResponse(422,
+                                   errors=api_error('invalid_cursor',
+                                                    field='query.after'))
+        seek = pagination.seek_filter(sort, values)
+        page_filter = {'$and': [_filter, seek]} if _filter else seek
+        skip = 0
+    # Sort fields must be returned to build next cursor.
+    projection, hidden = pagination.ensure_fields(projection, list(sort))
+    # Without count one more document tells if there is a next page.
+    page_limit = limit + 1 if count == counting.NONE else limit
+
     # If any filter key contains '.' it means that we have to embed.
-    if [k for k in _filter if '.' in k] or embed:
+    fields = filter_fields(_filter)
+    if [k for k in fields if '.' in k] or embed:
         if not embed:
             embed = []
 
-        pipeline = [
-            {
-                "$match": _filter
-            },
-            {
-                '$skip': skip
-            },
-            {
-                '$limit': limit
-            },
-        ]
-        if sort:
-            pipeline.append({'$sort': sort})
-        if projection:
-            pipeline.insert(
-                1,
-                {'$project': projection},
-            )
-
         # Embeds from query._filters.
         embeds_objs: List[Embed] = [
-            embeds_storage[e.split('.')[0]] for e in _filter
-            if '.' in e and isinstance(embeds_storage[e.split('.')[0]], Embed)
+            embeds_storage[e.split('.')[0]] for e in fields if '.' in e
+            and isinstance(embeds_storage.get(e.split('.')[0]), Embed)
         ] + [
             # Embeds from query.embed.
             embeds_storage[e]
@@ -67,45 +93,37 @@ def find(collection: str,
             if isinstance(embeds_storage[e], FuncEmbed)
         ]
 
-        # Add as lookups.
-        for i, e in enumerate(embeds_objs):
-            pipeline.insert(i, {'$lookup': e.to_query()})
-
-        # When we embed we don't want local_fields to appear.
-        # If local_field is in any FuncEmbebs local_fields it is not projected
-        # because 1) FuncEmbed needs it to work 2) FuncEmbed will delete it.
-        if embeds_objs and not func_embeds_objs:
-            pipeline.append({
-                "$project": {
-                    e.local_filed: False
-                    for e in embeds_objs if e.local_filed not in
-                    [fe.local_filed for fe in func_embeds_objs]
-                }
-            })
-
-        # Unwind embeded fields because they appear as array.
-        for e in embeds_objs:
-            if not e.is_array:
-                pipeline.append({
-                    '$unwind': {
-                        'path': f'${e.name}',
-                        'preserveNullAndEmptyArrays': True
-                    }
-                })
-
-        if not embed:
-            pipeline.append({"$project": {e.name: False for e in embeds_objs}})
-        db_data = list(db[collection].aggregate(pipeline))
-
-        total_count: int = 0
-        if db_data:
-            # Here we use previous pipeline with $lookups and staff
-            # to get total documents count for pagination.
-            match_index = pipeline.index({'$match': _filter})
-            pipeline = pipeline[0:match_index]
-            pipeline.append({'$count': 'total_count'})
-            total_count = list(
-                db[collection].aggregate(pipeline))[0]['total_count']
+        # Exact count comes in the same round trip as the page. With cursor
+        # page filter differs from counted one, so it is counted separately.
+        in_facet = count == counting.EXACT and not after
+        pipeline = planner.plan(page_filter,
+                                sort,
+                                skip,
+                                page_limit,
+                                embeds_objs,
+                                projection,
+                                func_embeds_objs,
+                                keep_embeds=bool(embed),
+                                count=in_facet)
+        db_data = list(reader[collection].aggregate(pipeline,
+                                                    collation=collation))
+        facet_total = 0
+        if in_facet:
+            db_data, facet_total = planner.unpack(db_data)
+        db_data, has_more = _probe(db_data, limit, count)
+
+        def count_aggregation() -> int:
+            if in_facet:
+                return facet_total
+            count_pipeline = planner.count_pipeline(_filter, embeds_objs)
+            return planner.total_count(
+                list(reader[collection].aggregate(count_pipeline,
+                                                  collation=collation)))
+
+        total_count: Optional[int] = None
+        if db_data and count != counting.NONE:
+            total_count = _count(collection, _filter, count_aggregation,
+                                 count, embed, collation)
 
         # Addicionaly add FuncEmbeds.
         if func_embeds_objs and db_data:
@@ -114,18 +132,71 @@ def find(collection: str,
                     d[fe.name] = fe.func(d[fe.local_filed])
                     del d[fe.local_filed]
 
-        return ServiceResponse(200, db_data, total_count=total_count)
+        next_cursor = _next_cursor(db_data, sort, limit, has_more)
+        pagination.strip_fields(db_data, hidden)
+        return ServiceResponse(200,
+                               db_data,
+                               total_count=total_count,
+                               next_cursor=next_cursor,
+                               has_more=has_more)
 
-    if not sort:
-        sort = _parse_sort({'_id': 1})
-    else:
-        sort = _parse_sort(sort)
     if not projection:
         projection = None
-    db_data = db[collection].find(
-        _filter, projection).skip(skip).limit(limit).sort(sort)
-    total_count = db[collection].count_documents(_filter)
-    return ServiceResponse(200, list(db_data), total_count=total_count)
+    db_data = list(reader[collection].find(
+        page_filter, projection,
+        collation=collation).skip(skip).limit(page_limit).sort(
+            _parse_sort(sort)))
+    db_data, has_more = _probe(db_data, limit, count)
+    total_count = None
+    if count != counting.NONE:
+        total_count = _count(
+            collection, _filter,
+            lambda: reader[collection].count_documents(_filter,
+                                                       collation=collation),
+            count, collation=collation)
+    next_cursor = _next_cursor(db_data, sort, limit, has_more)
+    pagination.strip_fields(db_data, hidden)
+    return ServiceResponse(200,
+                           db_data,
+                           total_count=total_count,
+                           next_cursor=next_cursor,
+                           has_more=has_more)
+
+
+def _probe(db_data: List[Dict], limit: int,
+           count: str) -> Tuple[List[Dict], Optional[bool]]:
+    """With count=none there is one extra document fetched. Strip it."""
+    if count != counting.NONE:
+        return db_data, None
+    return db_data[:limit], len(db_data) > limit
+
+
+def _count(collection: str,
+           _filter: Filter,
+           exact: Callable[[], int],
+           count: str,
+           embed: List[str] = None,
+           collation: Dict[str, Any] = None) -> int:
+    if count != counting.ESTIMATED:
+        return exact()
+    # Lookups don't change number of documents so metadata count is fine.
+    if not _filter:
+        return db[collection].estimated_document_count()
+    key = (collection, counting.normalize(_filter), tuple(embed or []),
+           counting.normalize(collation))
+    return counting.memoized(key, exact)
+
+
+def _next_cursor(db_data: List[Dict],
+                 sort: Sort,
+                 limit: int,
+                 has_more: Optional[bool] = None) -> Optional[str]:
+    """There may be next page only if this one is full."""
+    if has_more is False:
+        return None
+    if db_data and len(db_data) == limit:
+        return pagination.encode_cursor(db_data[-1], sort)
+    return None
 
 
 def find_with_query(collection: str, query: FindQuery) -> ServiceResponse:
@@ -135,10 +206,34 @@ def find_with_query(collection: str, query: FindQuery) -> ServiceResponse:
                    query.sort,
                    skip=query.skip,
                    embed=query.embed,
-                   limit=query.limit)
+                   limit=query.limit,
+                   after=query.after,
+                   count=query.count,
+                   collation=query.collation)
     return resoult
 
 
+def stream_with_query(collection: str,
+                      query: FindQuery,
+                      batch_size: int = EXPORT_BATCH_SIZE) -> ServiceResponse:
+    """Like find_with_query, but without pagination and embeds.
+    Documents are read lazily from cursor in batches and sent as NDJSON,
+    so memory usage doesn't depend on number of documents."""
+    # Generator runs after service returns, outside of secondary_reads().
+    reader = get_reader()
+
+    def documents() -> Iterator[Dict]:
+        cursor = reader[collection].find(query._filter,
+                                         query.projection or None,
+                                         batch_size=batch_size,
+                                         collation=query.collation)
+        yield from cursor.sort(_parse_sort(query.sort))
+
+    return ServiceResponse(200,
+                           documents(),
+                           content_type='application/x-ndjson')
+
+
 def find_one(collection: str,
              _filter: Filter,
              projection: Projection = None,
@@ -146,6 +241,7 @@ def find_one(collection: str,
     if embed:
         res = find(collection, _filter, projection, limit=1, embed=embed)
         res.total_count = None
+        res.next_cursor = None
         return res
     resoult = db[collection].find_one(_filter, projection)
     error = None
@@ -158,7 +254,19 @@ def find_one_by_id(collection: str,
                    _id: int,
                    projection: Projection = None,
                    embed: List[str] = None) -> ServiceResponse:
-    resoult = find_one(collection, {'_id': _id}, projection, embed)
+    """Documents of collections with enabled doc_cache are cached, unless
+    they are embeded."""
+    if embed or not doc_cache.is_enabled(collection):
+        return find_one(collection, {'_id': _id}, projection, embed)
+
+    document = doc_cache.get(collection, _id, projection)
+    if document is not None:
+        return ServiceResponse(200, document)
+    version = versions.get(collection)
+    resoult = find_one(collection, {'_id': _id}, projection)
+    if not resoult.errors:
+        doc_cache.store(collection, _id, projection, resoult.response,
+                        version)
     return resoult
 
 
@@ -170,23 +278,32 @@ def update_one(collection: str, _id: int,
         error = api_error(f'{collection[:-1]}_not_found')
 
     if not error:
+        versions.bump(collection)
+        doc_cache.invalidate(collection, _id)
         return ServiceResponse(204, errors=error)
     return ServiceResponse(404)
 
 
+def _is_id_taken(collection: str, _id: int) -> bool:
+    """Tells if duplicate key error was caused by _id and not other unique
+    index. Older servers don't tell which key it was."""
+    return db[collection].count_documents({'_id': _id}, limit=1) > 0
+
+
 def insert_one(collection: str, body: Dict[str, Any]) -> ServiceResponse:
-    if collection in id_cache:
-        last_document_id = id_cache[collection] + 1
-        id_cache.update({collection: last_document_id})
-    else:
-        last_document = db[collection].find_one({}, sort=[('_id', -1)])
-        if last_document:
-            last_document_id = last_document['_id'] + 1
-        else:
-            last_document_id = 1
-        id_cache.update({collection: last_document_id})
-    body['_id'] = last_document_id
-    update_resoult = db[collection].insert_one(body)
+    """_id is given by api.database.ids. Insert is retried when the id is
+    taken already, eg. by document inserted without counters."""
+    for attempt in range(ID_RETRIES):
+        body['_id'] = ids.next_id(collection)
+        try:
+            update_resoult = db[collection].insert_one(body)
+            break
+        except DuplicateKeyError:
+            if (attempt == ID_RETRIES - 1
+                    or not _is_id_taken(collection, body['_id'])):
+                raise
+            ids.resync(collection)
+    versions.bump(collection)
 
     error = None
     if update_resoult.inserted_id == 0:
@@ -201,6 +318,155 @@ def delete_one(collection: str, _id: int) -> ServiceResponse:
         error = api_error(f'{collection[:-1]}_not_found', entities=[_id])
 
     if not error:
+        versions.bump(collection)
+        doc_cache.invalidate(collection, _id)
         return ServiceResponse(204, errors=error)
     else:
         return ServiceResponse(404, errors=error)
+
+
+def _chunks(items: List[Any]) -> Iterator[Tuple[int, List[Any]]]:
+    for start in range(0, len(items), BULK_CHUNK_SIZE):
+        yield start, items[start:start + BULK_CHUNK_SIZE]
+
+
+def _write_chunks(
+        collection: str,
+        operations: List[WriteOperation]) -> Tuple[Dict[str, int], List[Dict]]:
+    """Runs unordered bulk writes. Returns summed counts and write errors
+    with index of operation in whole list."""
+    counts = {'inserted': 0, 'matched': 0, 'modified': 0, 'deleted': 0,
+              'upserted': 0}
+    write_errors: List[Dict] = []
+    for start, chunk in _chunks(operations):
+        try:
+            result = db[collection].bulk_write(chunk, ordered=False)
+            details = result.bulk_api_result
+        except BulkWriteError as e:
+            details = e.details
+            for write_error in details['writeErrors']:
+                write_errors.append({
+                    **write_error, 'index': start + write_error['index']
+                })
+        counts['inserted'] += details['nInserted']
+        counts['matched'] += details['nMatched']
+        counts['modified'] += details['nModified']
+        counts['deleted'] += details['nRemoved']
+        counts['upserted'] += details['nUpserted']
+    return counts, write_errors
+
+
+def _write_error(write_error: Dict, entity: Any) -> ApiError:
+    if write_error.get('code') == 11000:
+        return api_error('duplicate_entry', entities=[entity])
+    return api_error('bulk_write_failed', [write_error.get('errmsg', '')],
+                     entities=[entity])
+
+
+def bulk_write(collection: str,
+               operations: List[WriteOperation]) -> ServiceResponse:
+    """Unordered bulk write in chunks of BULK_CHUNK_SIZE operations.
+    Failed operations are reported as errors with their index in entities,
+    others are written anyway. Inserted documents must have _id already."""
+    counts, write_errors = _write_chunks(collection, operations)
+    if sum(counts.values()):
+        versions.bump(collection)
+    errors = [_write_error(e, e['index']) for e in write_errors]
+    return ServiceResponse(422 if errors else 200, counts, errors=errors)
+
+
+def insert_many(collection: str, bodies: List[Dict[str, Any]]) -> ServiceResponse:
+    """Like insert_one, but all ids are allocated in one step. Failed
+    documents are reported as errors with their index in entities, others
+    are inserted anyway. Response has ids of inserted documents."""
+    pending = list(range(len(bodies)))
+    # Index of body -> write error. Kept across attempts, an entry is dropped
+    # only when its body is retried.
+    errors: Dict[int, Dict] = {}
+    inserted_indexes: List[int] = []
+    for attempt in range(ID_RETRIES):
+        for i, _id in zip(pending, ids.next_ids(collection, len(pending))):
+            bodies[i]['_id'] = _id
+        _, write_errors = _write_chunks(
+            collection, [InsertOne(bodies[i]) for i in pending])
+        failed = {pending[e['index']]: e for e in write_errors}
+        acknowledged = [i for i in pending if i not in failed]
+        if acknowledged:
+            versions.bump(collection)
+        inserted_indexes += acknowledged
+        # Retried are only these which got id taken by other document.
+        taken = {
+            d['_id']
+            for d in db[collection].find(
+                {'_id': {
+                    '$in': [bodies[i]['_id'] for i in failed]
+                }}, {'_id': True})
+        } if failed and attempt < ID_RETRIES - 1 else set()
+        errors.update(failed)
+        pending = [i for i in failed if bodies[i]['_id'] in taken]
+        for i in pending:
+            del errors[i]
+        if taken:
+            ids.resync(collection)
+        if not pending:
+            break
+
+    inserted = [bodies[i]['_id'] for i in sorted(inserted_indexes)]
+    api_errors = [_write_error(e, i) for i, e in sorted(errors.items())]
+    return ServiceResponse(422 if api_errors else 201, {'ids': inserted},
+                           errors=api_errors)
+
+
+def _existing_ids(collection: str, _ids: List[int]) -> List[int]:
+    return [
+        d['_id']
+        for d in db[collection].find({'_id': {
+            '$in': _ids
+        }}, {'_id': True})
+    ]
+
+
+def update_many_by_ids(collection: str, _ids: List[int],
+                       update_body: Dict[str, Any]) -> ServiceResponse:
+    """Sets update_body in documents with given ids. Missing ones are reported
+    as not found errors with their ids in entities."""
+    _ids = list(dict.fromkeys(_ids))
+    matched = 0
+    for _, chunk in _chunks(_ids):
+        resoult = db[collection].update_many({'_id': {
+            '$in': chunk
+        }}, {'$set': update_body})
+        matched += resoult.matched_count
+    if matched:
+        versions.bump(collection)
+    if matched == len(_ids):
+        return ServiceResponse(204)
+    existing = set(_existing_ids(collection, _ids))
+    missing = [_id for _id in _ids if _id not in existing]
+    return ServiceResponse(404,
+                           errors=api_error(f'{collection[:-1]}_not_found',
+                                            entities=missing))
+
+
+def delete_many_by_ids(collection: str, _ids: List[int]) -> ServiceResponse:
+    """Deletes documents with given ids. Missing ones are reported as not
+    found errors with their ids in entities, others are deleted anyway."""
+    _ids = list(dict.fromkeys(_ids))
+    missing: List[int] = []
+    deleted = 0
+    for _, chunk in _chunks(_ids):
+        existing = set(_existing_ids(collection, chunk))
+        missing += [_id for _id in chunk if _id not in existing]
+        if existing:
+            resoult = db[collection].delete_many(
+                {'_id': {
+                    '$in': list(existing)
+                }})
+            deleted += resoult.deleted_count
+    if deleted:
+        versions.bump(collection)
+    if not missing:
+        return ServiceResponse(204)
+    return ServiceResponse(404,
+                           errors=api_error(f'{collection[:-1]}_not_found',
+                                            entities=missing))
@@ -50,6 +50,7 @@ def to_polish(error: ApiError) -> ApiError:
 
 ERRORS: Dict[str, Tuple[int, str, str]] = {
     'invalid_json':                         (40001, 'JSON docuemt is invalid.', 'Nie poprawna składnia dokumentu JSON.'),
+    'invalid_document':                     (40002, 'Request document is invalid.', 'Niepoprawna składnia dokumentu.'),
     'invalid_login_or_password':            (40101, 'Invalid authorization data.', 'Niepoprawne dane logowania.'),
     'login_required':                       (40102, 'Login is required.', 'Wymagane zalogowanie.'),
     'invalid_session_token':                (40103, 'Invalid session token.', 'Niepoprawny token sesji.'),
@@ -78,6 +79,7 @@ ERRORS: Dict[str, Tuple[int, str, str]] = {
     'image_not_found':                      (40407, 'Image not found.', 'Nie odnalezino obrazu.'),
     'categorie_not_found':                  (40408, 'Category not found.', 'Nie odnalezino kategorii.'),
     'resource_not_found':                   (40409, 'API resource not found.', 'Nie odnaleziono zasobu API.'),
+    'method_not_allowed':                   (40501, 'Method not allowed for API resource.', 'Niedozwolona metoda dla zasobu API.'),
     'quiz_is_not_long':                     (40901, 'Given quiz is not long one.', 'Ten quiz nie jest długim quizem.'),
     'quiz_is_not_short':                    (40902, 'Given quiz is not short one.', 'Ten quiz nie jest krótkim quizem.'),
     'not_enough_answers':                   (40903, 'Not all questions are answered.', 'Nie odpowiedziano na wszystkie pytania.'),
@@ -86,6 +88,7 @@ ERRORS: Dict[str, Tuple[int, str, str]] = {
     'wrong_number_of_answers':              (40906, 'Wrong number of answers', 'Nieprawidłowa ilość odpowiedzi na pytanie.'),
     'question_answer_mismatch':             (40906, 'This question is answered with {} field in answer body.', 'Na to pytanie należy odpowiedzieć polem {} w treści odpowiedzi.'),
     'missing_answers':                      (40907, 'Missing answers for some questions(look to entities).', 'Brakuje odpowiedzi na parę pytań. Patrz pole entities.'),
+    'payload_too_large':                    (41301, 'Request body is bigger than {} bytes.', 'Treść zapytania jest większa niż {} bajtów.'),
     'unsupported_media_type':               (41501, 'Content-Type header is diffrent than {}.', 'Nagłówek Content-Type jest różny od {}.'),
     'invalid_type':                         (42201, 'Invalid data type. Expected {}, but got {}.', 'Nieprawidłowy typ wartości ostrzymano {}, ale spodziewano się {}.'),
     'required_key_missing':                 (42202, 'Field is required.', 'Pole jest wymagane.'),
@@ -97,10 +100,15 @@ ERRORS: Dict[str, Tuple[int, str, str]] = {
     'pattern_mismatch':                     (42208, 'String does not mach pattern. Pattern: {}.', 'Napis nie pasuje do wyrażenia regularnego. Wyrażenie: {}.'),
     'invalid_value':                        (42209, 'Invalid value. Expected be one of {}.', 'Niepoprawna wartość. Spodziwano się jednej z {}.'),
     'list_too_big':                         (42210, 'Too many list elements. Maxumim {}.', 'Lista jest zbyt duża. Maksimum elementów {}.'),
-    'image_too_big':                        (42212, 'Image is bigger than 1 MB.', 'Obraz jest większy niż 1 MB'),
     'image_is_not_raw_png':                 (42213, 'Request content is not png file.', 'Podany plik nie ma formatu png.'),
     'duplicate_entry':                      (42214, 'Field is a duplicate.', 'Pole jest duplikatem.'),
     'required_key_missing_unless':          (42215, 'Field is required unless defined {}.', 'Pole jest wymagane jeśli nie zdefiniowano {}.'),
+    'invalid_cursor':                       (42216, 'Invalid pagination cursor.', 'Niepoprawny kursor stronicowania.'),
+    'nested_batch_request':                 (42217, 'Batch requests cannot be nested.', 'Nie można zagnieżdżać zapytań wsadowych.'),
+    'document_too_deep':                    (42218, 'Document is nested too deep. Maximum depth {}.', 'Dokument jest zbyt głęboko zagnieżdżony. Maksymalna głębokość {}.'),
+    'bulk_write_failed':                    (42219, 'Write failed: {}.', 'Zapis nie powiódł się: {}.'),
+    'batch_response_not_json':              (42220, 'Only requests with JSON responses can be batched.', 'Tylko zapytania z odpowiedzią JSON mogą być w zapytaniu wsadowym.'),
     'internal_error':                       (50001, 'Internal API eror.', 'Wewnętrzny błąd API.'),
     'email_api_error':                      (50002, 'Email API name.', 'Błąd przy wysyłaniu maila.'),
+    'server_busy':                          (50301, 'Server is busy. Try again later.', 'Serwer jest przeciążony. Spróbuj ponownie później.'),
 }
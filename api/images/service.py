@@ -15,6 +15,10 @@ from api.middlewares import require_auth
 
 IMAGES_DIR: str = os.environ.get('API_IMAGES_DIR')  # type: ignore
 
+# Body limit of POST /images. Bigger images are rejected by rest.post with
+# 413 payload_too_large before they are read, so save_image never sees them.
+MAX_IMAGE_SIZE = 1024 * 1024
+
 if not IMAGES_DIR:
     sys.exit('API_IMAGES_DIR not set!')
 
@@ -43,8 +47,6 @@ def _get_next_image_id() -> int:
 
 @require_auth('mod')
 def save_image(r: ServiceRequest) -> ServiceResponse:
-    if len(r.content) > 1024:
-        ServiceResponse(422, errors=errors.api_error('image_too_big'))
     image_type = imghdr.what("", h=r.content)
     if image_type is None or image_type != 'png':
         return ServiceResponse(422,
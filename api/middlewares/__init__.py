@@ -1,2 +1,5 @@
-from api.middlewares.validator import validate, check
-from api.middlewares.authentication import require_auth
+from api.middlewares.validator import validate, check, compile_schema
+from api.middlewares.authentication import (require_auth, invalidate_session,
+                                            invalidate_user_sessions)
+from api.middlewares.conditional import versioned
+from api.middlewares import signed_tokens
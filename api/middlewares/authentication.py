@@ -1,9 +1,13 @@
+import os
 import time
 from functools import wraps
 from typing import Callable, Dict, Tuple
 
 import api.database
 from api.common import ServiceRequest, ServiceResponse, UserSession
+from api.common.lru import LRUCache
+from api.database import versions
+from api.middlewares import signed_tokens
 from api.errors import ApiError, Optional, api_error
 
 _ROLES: Dict[str, int] = {
@@ -12,33 +16,99 @@ _ROLES: Dict[str, int] = {
     "user": 1,
 }
 
+# Sessions found by token, so not every request has to query session_tokens.
+# Value is (UserSession, version of SESSIONS stamp when it was cached).
+# Entries never outlive session's exp.
+_sessions = LRUCache(
+    "sessions",
+    int(os.environ.get("API_SESSION_CACHE_SIZE", 4096)),
+    ttl=float(os.environ.get("API_SESSION_CACHE_TTL", 60)),
+)
+
+# Version stamp bumped when sessions of a user are invalidated. Other workers
+# drop all their cached sessions after at most API_VERSIONS_TTL seconds.
+# Single sessions (logout) are revoked by token instead, see invalidate_session.
+SESSIONS = "sessions"
+versions.track(SESSIONS)
+
+
+def _find_session(session_token: str) -> Optional[UserSession]:
+    if signed_tokens.is_signed(session_token):
+        return signed_tokens.verify(session_token)
+
+    version = versions.get(SESSIONS)
+    cached = _sessions.get(session_token)
+    if cached and cached[1] == version:
+        if signed_tokens.is_revoked(session_token):
+            _sessions.delete(session_token)
+            return None
+        return cached[0]
+
+    resoult = api.database.db.session_tokens.find_one({"token": session_token})
+    if not resoult:
+        return None
+    user_session = UserSession(
+        resoult["_id"],
+        resoult["token"],
+        resoult["user_id"],
+        resoult["exp"],
+        resoult["role"],
+    )
+    ttl = user_session.exp - time.time()
+    if ttl > 0:
+        _sessions.set(session_token, (user_session, version), min(ttl, _sessions.ttl))
+    return user_session
+
+
+def invalidate_session(session_token: str):
+    """Must be called after session is deleted eg. on logout.
+    Signed token is revoked instead, because it is not stored anywhere.
+
+    Other workers can still have the session cached, so the token is revoked
+    for as long as their cache entries live. Their other cached sessions
+    are kept."""
+    if signed_tokens.is_signed(session_token):
+        signed_tokens.revoke(session_token)
+        return
+    _sessions.delete(session_token)
+    signed_tokens.revoke_opaque(session_token, int(time.time() + _sessions.ttl) + 1)
+
+
+def invalidate_user_sessions(user_id: int):
+    """Must be called after user's sessions are changed or deleted
+    eg. when role is changed or account is blocked."""
+    _sessions.delete_where(lambda token, cached: cached[0].user_id == user_id)
+    versions.bump(SESSIONS)
+    signed_tokens.revoke_user(user_id)
+
 
 def _check_role(
-    session_token: str, required_role: str, entity: str = None
+    session_token: str,
+    required_role: str,
+    entity: str = None,
+    user_session: UserSession = None,
 ) -> Tuple[Optional[UserSession], Optional[ApiError]]:
+    """user_session is a session already authenticated in this request
+    (eg. by POST /batch), then there is no need to look it up again."""
 
     if not session_token:
         return None, api_error("login_required")
 
-    resoult = api.database.db.session_tokens.find_one({"token": session_token})
-    if not resoult:
-        return None, api_error("invalid_session_token")
+    if not isinstance(user_session, UserSession) or user_session.token != session_token:
+        user_session = _find_session(session_token)
+        if not user_session:
+            return None, api_error("invalid_session_token")
 
-    if int(time.time()) > resoult["exp"]:
-        api.database.delete_one("session_tokens", _id=resoult["_id"])
+    if int(time.time()) > user_session.exp:
+        if not signed_tokens.is_signed(session_token):
+            api.database.delete_one("session_tokens", _id=user_session._id)
+            _sessions.delete(session_token)
         return None, api_error("session_expired")
 
-    if _ROLES[resoult["role"]] < _ROLES[required_role]:
+    if _ROLES[user_session.role] < _ROLES[required_role]:
         if entity:
             return None, api_error(f"{entity}_not_found")
         return None, api_error("invalid_role")
-    user_session = UserSession(
-        resoult["_id"],
-        resoult["token"],
-        resoult["user_id"],
-        resoult["exp"],
-        resoult["role"],
-    )
     return user_session, None
 
 
@@ -47,7 +117,10 @@ def require_auth(min_role: str = "user", entity: str = None) -> Callable:
         @wraps(f)
         def wrapper(service_request: ServiceRequest, *args, **kwagrs):
             user_session, error = _check_role(
-                service_request.session_token, min_role, entity
+                service_request.session_token,
+                min_role,
+                entity,
+                service_request.user_session,
             )
             # I'll fix this later maybe....
             service_request.user_session = user_session  # type: ignore
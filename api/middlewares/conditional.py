@@ -0,0 +1,62 @@
+"""Provides @versioned() decorator for read services.
+
+Response of decorated service is tagged with ETag built from versions of
+collections it reads (see api.database.versions), so when client sends that tag
+in If-None-Match, 304 is returned without reading anything from database.
+
+Must be placed under @require_auth(), because tag depends on user's role.
+>>> @require_auth()
+>>> @versioned('quizzes')
+>>> def find_one(r: ServiceRequest, quiz_id: int) -> ServiceResponse: ...
+"""
+
+from functools import wraps
+from typing import Callable, List, Optional
+
+from api.common import ServiceRequest, ServiceResponse, conditional, formats
+from api.database import embeds_storage, versions
+from api.database.wrappers import filter_fields
+
+
+def _read_collections(r: ServiceRequest, collections: tuple) -> List[str]:
+    """Collections given to decorator with collections of requested embeds."""
+    read = list(collections)
+    embeds = list(r.query.embed or []) + [
+        k.split('.')[0] for k in filter_fields(r.query._filter) if '.' in k
+    ]
+    for e in embeds:
+        read.append(getattr(embeds_storage.get(e), 'from_collection', None))
+    return read
+
+
+def _version_etag(r: ServiceRequest, collections: tuple,
+                  kwargs: dict) -> Optional[str]:
+    from flask import request
+    read = _read_collections(r, collections)
+    # Some of data can't be versioned so fall back to tag computed from body.
+    if not all(c and versions.is_tracked(c) for c in read):
+        return None
+    role = getattr(r.user_session, 'role', None)
+    # JSON and MessagePack representations need diffrent tags.
+    document_format = formats.negotiate(request.headers.get('Accept'))
+    return conditional.version_etag(*[(c, versions.get(c)) for c in read],
+                                    role, request.full_path,
+                                    sorted(kwargs.items()), document_format)
+
+
+def versioned(*collections: str) -> Callable:
+    def inner(f: Callable):
+        @wraps(f)
+        def wrapper(r: ServiceRequest, *args, **kwargs) -> ServiceResponse:
+            etag = _version_etag(r, collections, kwargs)
+            if conditional.matches(etag, r.if_none_match):
+                return ServiceResponse(304, etag=etag)
+
+            response = f(r, *args, **kwargs)
+            if etag and response.code == 200 and not response.errors:
+                response.etag = etag
+            return response
+
+        return wrapper
+
+    return inner
@@ -0,0 +1,194 @@
+"""Stateless session tokens signed with HMAC-SHA256.
+
+Used for new sessions when API_TOKEN_SECRETS is set. It is a comma separated
+list, the first secret signs new tokens and all of them are accepted, so
+a secret can be rotated without logging everyone out. Token looks like
+
+s1.<base64 payload>.<base64 signature>
+
+and payload carries user_id, role, exp, iat and jti, so require_auth checks it
+without any database access. Opaque tokens kept in session_tokens still work.
+
+Logout revokes a single token (by jti), blocking and role change revoke every
+token of a user issued before that moment. Revocations are kept in
+revoked_tokens collection only until revoked tokens expire (TTL index), so the
+list stays small. Every worker holds a copy of it which is reloaded when
+REVOKED stamp changes, so revocation is visible after at most
+API_VERSIONS_TTL seconds.
+
+Opaque tokens deleted on logout are put there as well, but only for as long as
+other workers can have their sessions cached (see revoke_opaque).
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import api.database
+from api.common import UserSession, codec
+from api.database import versions
+
+PREFIX = "s1."
+
+SECRETS: List[bytes] = [
+    s.strip().encode()
+    for s in os.environ.get("API_TOKEN_SECRETS", "").split(",")
+    if s.strip()
+]
+
+# Same as lifetime of opaque tokens.
+LIFETIME = 3 * 3600
+
+# Version stamp bumped on every revocation.
+REVOKED = "revoked_tokens"
+versions.track(REVOKED)
+
+api.database.expiring(REVOKED)
+
+# (version of REVOKED stamp, revoked jtis and opaque tokens, user_id -> tokens
+# issued before this time in ms are revoked). Replaced as a whole, never modified.
+_revoked: Tuple[int, Set[str], Dict[Any, int]] = (-1, set(), {})
+
+
+def enabled() -> bool:
+    return bool(SECRETS)
+
+
+def is_signed(session_token: str) -> bool:
+    return session_token.startswith(PREFIX)
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload: str, secret: bytes) -> str:
+    return _b64encode(hmac.new(secret, payload.encode(), hashlib.sha256).digest())
+
+
+def issue(user_id: int, role: str) -> Tuple[str, int]:
+    """Returns new token and its exp. Can be called only when enabled()."""
+    now = time.time()
+    exp = int(now) + LIFETIME
+    data = codec.dumps(
+        {
+            "user_id": user_id,
+            "role": role,
+            "exp": exp,
+            "iat": int(now * 1000),
+            "jti": secrets.token_urlsafe(12),
+        }
+    )
+    payload = _b64encode(data.encode() if isinstance(data, str) else data)
+    return f"{PREFIX}{payload}.{_sign(payload, SECRETS[0])}", exp
+
+
+def _decode(session_token: str) -> Optional[Dict]:
+    """Returns payload of token with valid signature."""
+    payload, _, signature = session_token[len(PREFIX):].partition(".")
+    # Compared as bytes, compare_digest rejects non-ASCII str.
+    if not any(
+        hmac.compare_digest(signature.encode(), _sign(payload, s).encode())
+        for s in SECRETS
+    ):
+        return None
+    try:
+        decoded = codec.loads(_b64decode(payload))
+    except (ValueError, TypeError):
+        return None
+    return decoded if isinstance(decoded, dict) else None
+
+
+def _sync() -> Tuple[int, Set[str], Dict[Any, int]]:
+    global _revoked
+    version = versions.get(REVOKED)
+    if version == _revoked[0]:
+        return _revoked
+
+    jtis: Set[str] = set()
+    users: Dict[Any, int] = {}
+    for document in api.database.db[REVOKED].find({"exp": {"$gt": int(time.time())}}):
+        if "user_id" in document:
+            users[document["user_id"]] = document["before"]
+        else:
+            jtis.add(document["_id"])
+    _revoked = (version, jtis, users)
+    return _revoked
+
+
+def verify(session_token: str) -> Optional[UserSession]:
+    """Returns session of valid and not revoked token. Expired sessions are
+    returned too, like the ones found in session_tokens."""
+    if not SECRETS:
+        return None
+    payload = _decode(session_token)
+    if not payload:
+        return None
+    _, jtis, users = _sync()
+    if payload["jti"] in jtis or payload["iat"] < users.get(payload["user_id"], 0):
+        return None
+    return UserSession(
+        payload["jti"],
+        session_token,
+        payload["user_id"],
+        payload["exp"],
+        payload["role"],
+    )
+
+
+def revoke(session_token: str):
+    """Revokes single token eg. on logout."""
+    payload = _decode(session_token) if SECRETS else None
+    if not payload or payload["exp"] <= time.time():
+        return
+    _revoke_id(payload["jti"], payload["exp"])
+
+
+def revoke_opaque(session_token: str, exp: int):
+    """Revokes token from session_tokens until exp, so workers which have its
+    session cached stop accepting it. The token itself must be deleted
+    from session_tokens by the caller."""
+    _revoke_id(session_token, exp)
+
+
+def is_revoked(session_token: str) -> bool:
+    """True for opaque tokens revoked with revoke_opaque."""
+    return session_token in _sync()[1]
+
+
+def _revoke_id(_id: str, exp: int):
+    api.database.db[REVOKED].update_one(
+        {"_id": _id},
+        {"$set": api.database.with_expiry({"exp": exp})},
+        upsert=True,
+    )
+    versions.bump(REVOKED)
+
+
+def revoke_user(user_id: int):
+    """Revokes every token of user issued until now."""
+    if not SECRETS:
+        return
+    now = time.time()
+    api.database.db[REVOKED].update_one(
+        {"_id": f"user_{user_id}"},
+        {
+            "$set": api.database.with_expiry(
+                {
+                    "user_id": user_id,
+                    "before": int(now * 1000) + 1,
+                    "exp": int(now) + LIFETIME + 1,
+                }
+            )
+        },
+        upsert=True,
+    )
+    versions.bump(REVOKED)
@@ -1,23 +1,34 @@
-"""This file provides check() and @validate() functions.
+"""This file provides check(), compile_schema() and @validate() functions.
+
+Schemas are compiled once into nested checker closures, so validation doesn't
+walk schema dict for every element of a document.
 
 Usage:
 errors = check(document, schema)
 
 or
 
+check_question = compile_schema(schema)
+errors = check_question(document)
+
+or
+
 @validate(schema)
 def add(document) -> ServiceResponse:
     ...
 """
 
 import functools
-import operator
+import os
 import re
 from typing import (
     Any,
     Callable,
     Dict,
+    FrozenSet,
+    Iterable,
     List,
+    Optional,
     Tuple,
     Union,
     TypeVar,
@@ -26,13 +37,20 @@ from typing import (
 
 from api.errors import api_error, ApiError
 from api.common import ServiceResponse, ServiceRequest, ServiceCallable
+from api.common.lru import LRUCache
 
 T = TypeVar("T")
 ApiErrors = List[ApiError]
 Document = Union[Dict, List]
 Schema = dict
-Stack = Dict[str, Any]
-Checker = Callable[[str, Document, Schema], Tuple[ApiErrors, Stack]]
+# Checks element found at path and appends errors to given list.
+Checker = Callable[[str, Any, ApiErrors], None]
+
+# Documents are nested only as deep as their schemas, except "any" elements
+# which are not checked. Those can't be nested deeper than MAX_DEPTH.
+MAX_DEPTH: int = int(os.environ.get("API_VALIDATION_MAX_DEPTH", 32))
+# Validation stops after this many errors. 0 means no limit.
+ERROR_CAP: int = int(os.environ.get("API_VALIDATION_ERROR_CAP", 50))
 
 # This dict is defined for types mapping to be
 # more readable for frontednd devs.
@@ -54,216 +72,305 @@ def _to_js_type(element: T) -> str:
     return _TYPES[type(element).__name__]
 
 
-def _dict(path: str, element: T, schema: Schema) -> Tuple[ApiErrors, Stack]:
-    errors: ApiErrors = []
-    stack: Stack = {}
-    if not isinstance(element, dict):
-        error = api_error(
-            "invalid_type", extra_info=["object", _to_js_type(element)], field=path
-        )
-        return [error], {}
+def _invalid_type(expected: str, path: str, element: Any) -> ApiError:
+    return api_error(
+        "invalid_type", extra_info=[expected, _to_js_type(element)], field=path
+    )
 
-    for required_key in schema["required"]:
-        if isinstance(required_key, str) and required_key not in element:
-            error = api_error("required_key_missing", field=f"{path},{required_key}")
-            errors.append(error)
-        if (
-            isinstance(required_key, dict)
-            and required_key["required"] not in element
-            and not all([k for k in required_key["unless"] if k in element])
-        ):
-            required = required_key["required"]
-            errors.append(
-                api_error(
-                    "required_key_missing_unless",
-                    [required_key["unless"]],
-                    field=f"{path},{required}",
-                )
-            )
 
-    for key in element.keys():
-        if key not in schema.keys():
-            error = api_error("unknown_field", field=f"{path},{key}")
-            errors.append(error)
-        else:
-            stack.update({f"{path},{key}": element[key]})  # type: ignore
-    return errors, stack
-
-
-def _list(path: str, element: T, schema: Schema) -> Tuple[ApiErrors, Stack]:
-    errors: ApiErrors = []
-    stack: Stack = {}
-
-    if not isinstance(element, list):
-        error = api_error(
-            "invalid_type", extra_info=["list", _to_js_type(element)], field=path
-        )
-        return [error], {}
-
-    # Ends check, because it would check as many times as len(element) so it could be
-    # infinity.
-    if len(element) > schema["max_elements"]:
-        error = api_error(
-            "list_too_big", extra_info=[schema["max_elements"]], field=path
-        )
-        errors.append(error)
-        return errors, stack
-
-    # If we have only one element in list than we don't have to check.
-    if not schema.get("allow_duplicates") and not len(element) < 1:
-        seen: Set[T] = set()
-        for i, e in enumerate(element):
-            if not isinstance(e, (dict, list)):
-                if e not in seen:
-                    seen.add(e)
-                else:
+def _compile_dict(schema: Schema, depth: int) -> Checker:
+    fields: Dict[str, Checker] = {
+        key: _compile(sub_schema, depth + 1)
+        for key, sub_schema in schema.items()
+        if key not in ("_type", "required")
+    }
+    # Field paths are joined with dots, so commas in keys are replaced as well.
+    suffixes: Dict[str, str] = {
+        key: "." + str(key).replace(",", ".") for key in fields
+    }
+    # (key, keys which make it optional or None, path suffix)
+    required: List[Tuple[Any, Any, str]] = []
+    for required_key in schema["required"]:
+        if isinstance(required_key, str):
+            suffix = "." + required_key.replace(",", ".")
+            required.append((required_key, None, suffix))
+        elif isinstance(required_key, dict):
+            key = required_key["required"]
+            suffix = "." + str(key).replace(",", ".")
+            required.append((key, required_key["unless"], suffix))
+
+    def check_dict(path: str, element: Any, errors: ApiErrors):
+        if not isinstance(element, dict):
+            errors.append(_invalid_type("object", path, element))
+            return
+
+        for key, unless, suffix in required:
+            if unless is None:
+                if key not in element:
                     errors.append(
-                        api_error(
-                            "duplicate_entry", extra_info=[e], field=f"{path}.{i}"
-                        )
+                        api_error("required_key_missing", field=path + suffix)
                     )
+            elif key not in element and not all(
+                [k for k in unless if k in element]
+            ):
+                errors.append(
+                    api_error(
+                        "required_key_missing_unless", [unless], field=path + suffix
+                    )
+                )
+
+        children = []
+        for key in element.keys():
+            checker = fields.get(key)
+            if checker is None:
+                field = f"{path}.{key}".replace(",", ".")
+                errors.append(api_error("unknown_field", field=field))
             else:
-                stack.update({f"{path},{i}": e})
+                children.append((checker, path + suffixes[key], element[key]))
+
+        # Fields are checked last to first, like in the former stack based
+        # interpreter, so errors come in the same order.
+        for checker, child_path, child in reversed(children):
+            checker(child_path, child, errors)
+
+    return check_dict
+
+
+def _compile_list(schema: Schema, depth: int) -> Checker:
+    max_elements = schema.get("max_elements")
+    allow_duplicates = schema.get("allow_duplicates")
+    items = _compile(schema["_items"], depth + 1) if "_items" in schema else None
 
-        for i, e in enumerate(seen):
-            stack.update({f"{path},{i}": e})
+    def check_list(path: str, element: Any, errors: ApiErrors):
+        if not isinstance(element, list):
+            errors.append(_invalid_type("list", path, element))
+            return
 
-    for i, e in enumerate(element):
-        stack.update({f"{path},{i}": e})
+        if max_elements is None:
+            raise KeyError("max_elements")
+        # Ends check, because it would check as many times as len(element) so it
+        # could be infinity.
+        if len(element) > max_elements:
+            errors.append(
+                api_error("list_too_big", extra_info=[max_elements], field=path)
+            )
+            return
+
+        if not allow_duplicates and element:
+            seen: Set[Any] = set()
+            scalars: List[int] = []
+            documents: List[int] = []
+            for i, e in enumerate(element):
+                if not isinstance(e, (dict, list)):
+                    scalars.append(i)
+                    if e not in seen:
+                        seen.add(e)
+                    else:
+                        errors.append(
+                            api_error(
+                                "duplicate_entry", extra_info=[e], field=f"{path}.{i}"
+                            )
+                        )
+                else:
+                    documents.append(i)
+            # Nested documents and lists are checked after scalars.
+            order: Iterable[int] = scalars[::-1] + documents[::-1]
+        else:
+            order = range(len(element) - 1, -1, -1)
+
+        if items is None:
+            if element:
+                raise KeyError("_items")
+            return
+        for i in order:
+            items(f"{path}.{i}", element[i], errors)
 
-    return errors, stack
+    return check_list
 
 
-def _string(path: str, element: T, schema: Schema) -> Tuple[ApiErrors, Stack]:
-    errors: ApiErrors = []
+def _compile_string(schema: Schema, depth: int) -> Checker:
     min_lenght = schema.get("min")
     max_lenght = schema.get("max")
     pattern = schema.get("pattern")
+    match = re.compile(pattern).match if pattern else None
 
-    if not isinstance(element, str):
-        error = api_error(
-            "invalid_type", extra_info=["string", _to_js_type(element)], field=path
-        )
-        return [error], {}
+    def check_string(path: str, element: Any, errors: ApiErrors):
+        if not isinstance(element, str):
+            errors.append(_invalid_type("string", path, element))
+            return
 
-    if min_lenght and len(element) < min_lenght:
-        error = api_error("string_too_short", extra_info=[f"{min_lenght}"], field=path)
-        errors.append(error)
+        if min_lenght and len(element) < min_lenght:
+            errors.append(
+                api_error(
+                    "string_too_short", extra_info=[f"{min_lenght}"], field=path
+                )
+            )
 
-    if max_lenght and len(element) > max_lenght:
-        error = api_error(
-            "string_too_long", extra_info=[f"{max_lenght} (exclusive)"], field=path
-        )
-        errors.append(error)
+        if max_lenght and len(element) > max_lenght:
+            errors.append(
+                api_error(
+                    "string_too_long",
+                    extra_info=[f"{max_lenght} (exclusive)"],
+                    field=path,
+                )
+            )
 
-    if pattern:
-        if not re.match(pattern, element):
-            error = api_error("pattern_mismatch", extra_info=[pattern], field=path)
-            errors.append(error)
+        if match and not match(element):
+            errors.append(
+                api_error("pattern_mismatch", extra_info=[pattern], field=path)
+            )
 
-    return errors, {}
+    return check_string
 
 
-def _integer(path: str, element: T, schema: Schema) -> Tuple[ApiErrors, Stack]:
-    errors: ApiErrors = []
+def _compile_integer(schema: Schema, depth: int) -> Checker:
     min_value = schema.get("min")
     max_value = schema.get("max")
 
-    if not isinstance(element, int):
-        error = api_error(
-            "invalid_type", extra_info=["int", _to_js_type(element)], field=path
-        )
-        return [error], {}
+    def check_integer(path: str, element: Any, errors: ApiErrors):
+        if not isinstance(element, int):
+            errors.append(_invalid_type("int", path, element))
+            return
 
-    if min_value and element < min_value:
-        error = api_error("number_too_low", extra_info=[f"{min_value}"], field=path)
-        errors.append(error)
+        if min_value and element < min_value:
+            errors.append(
+                api_error("number_too_low", extra_info=[f"{min_value}"], field=path)
+            )
 
-    if max_value and element > max_value:
-        error = api_error("number_too_high", extra_info=[f"{max_value}"], field=path)
-        errors.append(error)
+        if max_value and element > max_value:
+            errors.append(
+                api_error("number_too_high", extra_info=[f"{max_value}"], field=path)
+            )
 
-    return errors, {}
+    return check_integer
 
 
-def _enum(path: str, element: T, schema: Schema) -> Tuple[ApiErrors, Stack]:
-    errors: ApiErrors = []
+def _compile_enum(schema: Schema, depth: int) -> Checker:
     values = schema["values"]
-    if element not in values:
-        error = api_error("invalid_value", extra_info=[values], field=path)
-        errors.append(error)
-    return errors, {}
-
-
-def _boolean(path: str, element: T, schema: Schema) -> Tuple[ApiErrors, Stack]:
-    errors: ApiErrors = []
-    if not isinstance(element, bool):
-        element_type = _to_js_type(element)
-        error = api_error("invalid_type", extra_info=["int", element_type], field=path)
-        errors.append(error)
-    return errors, {}
-
-
-_CHECKERS: Dict[str, Checker] = {
-    "dict": _dict,
-    "list": _list,
-    "str": _string,
-    "int": _integer,
-    "enum": _enum,
-    "bool": _boolean,
+    try:
+        lookup: Optional[FrozenSet] = frozenset(values)
+    except TypeError:
+        lookup = None
+
+    def check_enum(path: str, element: Any, errors: ApiErrors):
+        try:
+            found = element in lookup if lookup is not None else element in values
+        except TypeError:
+            # Unhashable element eg. dict.
+            found = element in values
+        if not found:
+            errors.append(api_error("invalid_value", extra_info=[values], field=path))
+
+    return check_enum
+
+
+def _compile_boolean(schema: Schema, depth: int) -> Checker:
+    def check_boolean(path: str, element: Any, errors: ApiErrors):
+        if not isinstance(element, bool):
+            errors.append(_invalid_type("int", path, element))
+
+    return check_boolean
+
+
+def _too_deep(element: Any, max_depth: int) -> bool:
+    """True when element has more than max_depth levels of nested elements."""
+    level = [element]
+    depth = 0
+    while level:
+        nested: List[Any] = []
+        for e in level:
+            if isinstance(e, dict):
+                nested.extend(e.values())
+            elif isinstance(e, list):
+                nested.extend(e)
+        if nested:
+            depth += 1
+            if depth > max_depth:
+                return True
+        level = nested
+    return False
+
+
+def _compile_any(schema: Schema, depth: int) -> Checker:
+    """Accepts everything. Nested elements are not checked, only their depth."""
+
+    def check_any(path: str, element: Any, errors: ApiErrors):
+        if _too_deep(element, MAX_DEPTH - depth):
+            errors.append(
+                api_error("document_too_deep", extra_info=[MAX_DEPTH], field=path)
+            )
+
+    return check_any
+
+
+_COMPILERS: Dict[str, Callable[[Schema, int], Checker]] = {
+    "dict": _compile_dict,
+    "list": _compile_list,
+    "str": _compile_string,
+    "int": _compile_integer,
+    "enum": _compile_enum,
+    "bool": _compile_boolean,
+    "any": _compile_any,
 }
 
 
-def _get_nested_schema_item(schema: Schema, path: str) -> Any:
-    """Gets nested schema item from schema by path.
-    Comma: , is used as a separator to prevent collisions with embeds' names.
+def _compile(schema: Schema, depth: int = 0) -> Checker:
+    return _COMPILERS[schema["_type"]](schema, depth)
 
-    Example:
-    >>> _get_nested_schema_item([{'foo':'bar'}], path: '0,foo')
-    'bar'
-    >>> _get_nested_schema_item({'a':{'b':'c'}}, path: 'a,b')
-    'c'
-    """
-    # Substitute number to '_items' to get sub_schema for every list index.
-    path_list = ["_items" if item.isdigit() else item for item in path.split(",")]
-
-    # Type is ignored because operator.getitem() does not support string as a key.
-    # But is needed for getting dict item.
-    return functools.reduce(
-        operator.getitem,  # type: ignore
-        path_list,
-        schema,
-    )
 
+class _ErrorCapReached(Exception):
+    pass
 
-def check(document: Document, schema: Schema, data_prefix: str = "data") -> ApiErrors:
 
-    _schema = {data_prefix: schema}
-    stack: Stack = {data_prefix: document}
-    errors: ApiErrors = []
+class _CappedErrors(list):
+    """Stops validation by raising _ErrorCapReached when ERROR_CAP is reached."""
+
+    def append(self, error: ApiError):
+        super().append(error)
+        if len(self) >= ERROR_CAP:
+            raise _ErrorCapReached()
 
-    while stack:
-        path, element = stack.popitem()
 
-        current_schema: Schema = _get_nested_schema_item(  # type: ignore
-            _schema, path
-        )
+def compile_schema(schema: Schema) -> Callable[..., ApiErrors]:
+    """Compiles schema once into nested checker closures.
+    Returned function works like check() with given schema.
 
-        if not document:
-            return [
+    >>> check_question = compile_schema(QUESTION)
+    >>> errors = check_question(document, "data")
+    """
+    root = _compile(schema)
+
+    def run(document: Document, data_prefix: str = "data") -> ApiErrors:
+        # Only dict schemas have required keys, empty lists etc. are checked
+        # like any other document.
+        if not document and schema["_type"] == "dict":
+            missing = [
                 api_error("required_key_missing", field=f"{data_prefix}.{rk}")
-                for rk in current_schema["required"]
+                for rk in schema["required"]
             ]
+            return missing[:ERROR_CAP] if ERROR_CAP else missing
+        errors: ApiErrors = _CappedErrors() if ERROR_CAP else []
+        try:
+            root(data_prefix.replace(",", "."), document, errors)
+        except _ErrorCapReached:
+            pass
+        return list(errors)
 
-        sub_check = _CHECKERS[current_schema["_type"]](path, element, current_schema)
+    return run
 
-        errors += sub_check[0]
-        stack.update(sub_check[1])
-        # Replace , with . for clarity.
-        for e in errors:
-            if "field" in e:
-                e["field"] = e["field"].replace(",", ".")  # type: ignore
-    return errors
+
+# Schemas passed straight to check() are compiled on first use.
+# Key is id(schema), value is (schema, compiled), so id can't be reused.
+_compiled = LRUCache("compiled_schemas", 256)
+
+
+def check(document: Document, schema: Schema, data_prefix: str = "data") -> ApiErrors:
+    """Schema must not be changed after it was checked against for the first time."""
+    compiled = _compiled.get(id(schema))
+    if compiled is None or compiled[0] is not schema:
+        compiled = (schema, compile_schema(schema))
+        _compiled.set(id(schema), compiled)
+    return compiled[1](document, data_prefix)
 
 
 def validate(schema: Schema, data_prefix: str = "data") -> Callable:
@@ -273,15 +380,18 @@ def validate(schema: Schema, data_prefix: str = "data") -> Callable:
     checked eg.
     >>> @validate(schema)
     >>> def my_add_service(request: ServiceRequest) -> ServiceResponse: ...
+
+    Schema is compiled once, when decorator is applied.
     """
+    checker = compile_schema(schema)
 
     def inner(f: ServiceCallable):
         @functools.wraps(f)
         def wraper(
             request: ServiceRequest, *args, **kwargs
         ) -> Union[ServiceResponse, ServiceCallable]:
-            errors: ApiErrors = check(
-                request.content, schema, data_prefix
+            errors: ApiErrors = checker(
+                request.content, data_prefix
             )  # type: ignore
             response = ServiceResponse(422, errors=errors)
             return f(request, *args, **kwargs) if not errors else response
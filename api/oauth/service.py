@@ -85,7 +85,5 @@ def verify_state(r: ServiceRequest) -> ServiceResponse:
         'role': existing_account['role'],
         'user_id': existing_account['_id'],
     }
-    session_token = api.user_session.service._generate_session_token(
-        token_data)
-    api.database.insert_one('session_tokens', session_token)
+    session_token = api.user_session.service._create_session(token_data)
     return ServiceResponse(201, {'session_token': session_token})
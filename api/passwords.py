@@ -0,0 +1,75 @@
+"""Argon2 password hashing done in a bounded thread pool.
+
+Hashing is deliberately expensive, so it is not done in request threads.
+argon2 releases the GIL, so at most API_PASSWORD_WORKERS hashes are computed at
+once and other requests are served meanwhile. When API_PASSWORD_QUEUE more
+operations are already waiting, Saturated is raised at once and services
+respond with 503 instead of piling up requests.
+
+Hasher parameters are set with API_ARGON2_TIME_COST, API_ARGON2_MEMORY_COST
+(KiB) and API_ARGON2_PARALLELISM. Hashes made with other parameters are
+rehashed on login (see needs_rehash).
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+import argon2
+
+T = TypeVar('T')
+
+hasher = argon2.PasswordHasher(
+    time_cost=int(
+        os.environ.get('API_ARGON2_TIME_COST', argon2.DEFAULT_TIME_COST)),
+    memory_cost=int(
+        os.environ.get('API_ARGON2_MEMORY_COST', argon2.DEFAULT_MEMORY_COST)),
+    parallelism=int(
+        os.environ.get('API_ARGON2_PARALLELISM', argon2.DEFAULT_PARALLELISM)),
+)
+
+WORKERS: int = int(os.environ.get('API_PASSWORD_WORKERS', os.cpu_count() or 1))
+QUEUE: int = int(os.environ.get('API_PASSWORD_QUEUE', 4 * WORKERS))
+
+_pool = ThreadPoolExecutor(WORKERS, thread_name_prefix='passwords')
+# Operations running and waiting in pool.
+_slots = threading.BoundedSemaphore(WORKERS + QUEUE)
+
+
+class Saturated(Exception):
+    """Too many password operations are in progress."""
+
+
+def _run(f: Callable[..., T], *args) -> T:
+    if not _slots.acquire(blocking=False):
+        raise Saturated()
+    try:
+        future = _pool.submit(f, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future.result()
+
+
+def hash(password: str) -> str:
+    return _run(hasher.hash, password)
+
+
+def _verify(password_hash: str, password: str) -> bool:
+    try:
+        return hasher.verify(password_hash, password)
+    except (argon2.exceptions.VerificationError,
+            argon2.exceptions.InvalidHash):
+        # Eg. account made with Sign-In with Google has no password.
+        return False
+
+
+def verify(password_hash: str, password: str) -> bool:
+    return _run(_verify, password_hash, password)
+
+
+def needs_rehash(password_hash: str) -> bool:
+    """Cheap, does not use the pool."""
+    return hasher.check_needs_rehash(password_hash)
@@ -1,11 +1,17 @@
 from typing import List
 
-from api.questions.schema import QUESTIONS_QUERY, SINGLE_QUESTION_QUERY
+from api.questions.schema import (QUESTIONS_EXPORT_QUERY, QUESTIONS_QUERY,
+                                  SINGLE_QUESTION_QUERY)
 from api.common.rest import post, get, patch, ResourceEndpoint
-from api.questions.service import add, find_many, find_one, update_one, check
+from api.questions.service import (add, export, find_many, find_one, update_one,
+                                   check)
 
 endpoints: List[ResourceEndpoint] = [
     get('/questions', find_many, query_schema=QUESTIONS_QUERY),
+    get('/questions/export',
+        export,
+        query_schema=QUESTIONS_EXPORT_QUERY,
+        secondary_reads=True),
     get('/questions/<int:question_id>',
         find_one,
         query_schema=SINGLE_QUESTION_QUERY),
@@ -1,4 +1,5 @@
-from api.common.schema import delete_required
+from api.common import CASE_INSENSITIVE
+from api.common.schema import delete_keys, delete_required
 import api.database
 
 QUESTION = {
@@ -111,9 +112,32 @@ QUESTION = {
 
 UPDATE_QUESTION = delete_required(QUESTION)
 
+# Fields which can be selected with fields= query param.
+QUESTION_FIELDS = [
+    '_id', 'category_id', 'text', 'content', 'sub_questions', 'answers',
+    'correct_answers', 'image_id', 'hint', 'view_correct_answers',
+    'created_at', 'author_id'
+]
+
+# Fields filtered by text in GET /questions.
+api.database.Index('questions', [('text', 1)], collation=CASE_INSENSITIVE)
+api.database.Index('questions', [('answers', 1)], collation=CASE_INSENSITIVE)
+api.database.Index('questions', [('hint', 1)], collation=CASE_INSENSITIVE)
+# Filters by category and author (eg. when account is deleted).
+api.database.Index('questions', [('category_id', 1)])
+api.database.Index('questions', [('author_id', 1)])
+
 QUESTIONS_QUERY = {
     '_type': 'dict',
     'required': [],
+    'fields': {
+        '_type': 'list',
+        'max_elements': 20,
+        '_items': {
+            '_type': 'enum',
+            'values': QUESTION_FIELDS,
+        }
+    },
     'exclude': {
         '_type': 'list',
         'max_elements': 20,
@@ -144,6 +168,14 @@ QUESTIONS_QUERY = {
         '_type': 'int',
         'min': 1,
     },
+    'after': {
+        '_type': 'str',
+        'max': 2000,
+    },
+    'count': {
+        '_type': 'enum',
+        'values': ['exact', 'estimated', 'none'],
+    },
     '_id': {
         '_type': 'list',
         'max_elements': 100,
@@ -230,9 +262,23 @@ QUESTIONS_QUERY = {
     }
 }
 
+# Export has no pagination and embeds.
+QUESTIONS_EXPORT_QUERY = delete_keys(QUESTIONS_QUERY, [
+    'limit', 'skip', 'after', 'count', 'embed', 'category.name',
+    'category.parent_id', 'category.main_parent_id'
+])
+
 SINGLE_QUESTION_QUERY = {
     '_type': 'dict',
     'required': [],
+    'fields': {
+        '_type': 'list',
+        'max_elements': 20,
+        '_items': {
+            '_type': 'enum',
+            'values': QUESTION_FIELDS,
+        }
+    },
     'exclude': {
         '_type': 'list',
         'max_elements': 20,
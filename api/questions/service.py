@@ -7,10 +7,12 @@ import api.database as db
 import api.images.service as images
 from api.common import ServiceRequest, ServiceResponse
 from api.errors import ApiError, api_error
-from api.middlewares import require_auth, validate
+from api.middlewares import require_auth, validate, versioned
 from api.questions import schema
 
 db.Embed('questions', 'questions_ids', 'questions', is_array=True)
+db.versions.track('questions')
+db.doc_cache.enable('questions')
 
 
 @validate(schema.QUESTION)
@@ -18,6 +20,7 @@ db.Embed('questions', 'questions_ids', 'questions', is_array=True)
 def add(r: ServiceRequest) -> ServiceResponse:
     r.content['created_at'] = int(time.time())
     r.content['author_id'] = r.user_session.user_id
+    # Category must exist.
     cat_req = categoreis.get(r, r.content['category_id'])
     if cat_req.errors:
         return cat_req
@@ -36,10 +39,6 @@ def add(r: ServiceRequest) -> ServiceResponse:
         if error:
             return ServiceResponse(404, errors=error)
 
-    cat_req = categoreis.get(r, r.content['category_id'])
-    if cat_req.errors:
-        return cat_req
-
     if 'sub_questions' in r.content:
         errors: List[ApiError] = [
             check_if_image_exists(  # type: ignore
@@ -57,6 +56,7 @@ def add(r: ServiceRequest) -> ServiceResponse:
 
 
 @require_auth()
+@versioned('questions')
 def find_one(r: ServiceRequest, question_id: int) -> ServiceResponse:
     res = db.find_one_by_id('questions', question_id, r.query.projection,
                             r.query.embed)
@@ -74,6 +74,7 @@ def find_one(r: ServiceRequest, question_id: int) -> ServiceResponse:
 
 
 @require_auth()
+@versioned('questions')
 def find_many(r: ServiceRequest) -> ServiceResponse:
     res = db.find_with_query('questions', r.query)
     if res.errors:
@@ -89,6 +90,12 @@ def find_many(r: ServiceRequest) -> ServiceResponse:
     return res
 
 
+@require_auth('mod')
+def export(r: ServiceRequest) -> ServiceResponse:
+    """Streams whole question bank (or its filtered part) as NDJSON."""
+    return db.stream_with_query('questions', r.query)
+
+
 @validate(schema.UPDATE_QUESTION)
 @require_auth('mod')
 def update_one(r: ServiceRequest, question_id: int) -> ServiceResponse:
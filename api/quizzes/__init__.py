@@ -3,10 +3,15 @@ from typing import List
 import api.common.rest as rest
 import api.quizzes.solve as solve
 from api.quizzes import service
-from api.quizzes.schema import QUIZZES_QUERY, SINGLE_QUIZ_QUERY
+from api.quizzes.schema import (QUIZZES_EXPORT_QUERY, QUIZZES_QUERY,
+                                SINGLE_QUIZ_QUERY)
 
 endpoints: List[rest.ResourceEndpoint] = [
     rest.get('/quizzes', service.find, query_schema=QUIZZES_QUERY),
+    rest.get('/quizzes/export',
+             service.export,
+             query_schema=QUIZZES_EXPORT_QUERY,
+             secondary_reads=True),
     rest.get('/quizzes/<int:quiz_id>',
              service.find_one,
              query_schema=SINGLE_QUIZ_QUERY),
@@ -1,5 +1,7 @@
-from api.common.schema import delete_required
+from api.common import CASE_INSENSITIVE
+from api.common.schema import delete_keys, delete_required
 from copy import deepcopy
+import api.database
 
 QUIZ = {
     "_type": "dict",
@@ -17,9 +19,31 @@ QUIZ = {
 
 UPDATE_QUIZ = delete_required(QUIZ)
 
+# Fields which can be selected with fields= query param.
+QUIZ_FIELDS = [
+    "_id",
+    "title",
+    "category_id",
+    "questions_ids",
+    "is_exam",
+    "minutes_to_solve",
+    "created_at",
+    "author_id",
+]
+
+api.database.Index("quizzes", [("title", 1)], collation=CASE_INSENSITIVE)
+# Filters by category and author (eg. when account is deleted).
+api.database.Index("quizzes", [("category_id", 1)])
+api.database.Index("quizzes", [("author_id", 1)])
+
 QUIZZES_QUERY = {
     "_type": "dict",
     "required": [],
+    "fields": {
+        "_type": "list",
+        "max_elements": 20,
+        "_items": {"_type": "enum", "values": QUIZ_FIELDS},
+    },
     "exclude": {
         "_type": "list",
         "max_elements": 20,
@@ -51,6 +75,8 @@ QUIZZES_QUERY = {
     },
     "limit": {"_type": "int", "min": 1, "max": 200,},
     "skip": {"_type": "int", "min": 1,},
+    "after": {"_type": "str", "max": 2000},
+    "count": {"_type": "enum", "values": ["exact", "estimated", "none"]},
     "_id": {"_type": "list", "max_elements": 100, "_items": {"_type": "int",}},
     "questions_ids": {
         "_type": "list",
@@ -65,7 +91,11 @@ QUIZZES_QUERY = {
     "created_at": {"_type": "list", "max_elements": 100, "_items": {"_type": "int",}},
     "author_id": {"_type": "list", "max_elements": 100, "_items": {"_type": "int",}},
     "is_exam": {"_type": "bool"},
-    "minutes_to_solve": {"_type": "list", "max_elements": 100,},
+    "minutes_to_solve": {
+        "_type": "list",
+        "max_elements": 100,
+        "_items": {"_type": "int",},
+    },
     "category_id": {"_type": "list", "max_elements": 20, "_items": {"_type": "int",}},
     "category.name": {
         "_type": "list",
@@ -92,9 +122,29 @@ QUIZZES_QUERY = {
     },
 }
 
+# Export has no pagination and embeds.
+QUIZZES_EXPORT_QUERY = delete_keys(
+    QUIZZES_QUERY,
+    [
+        "limit",
+        "skip",
+        "after",
+        "count",
+        "embed",
+        "category.name",
+        "category.parent_id",
+        "category.main_parent_id",
+    ],
+)
+
 SINGLE_QUIZ_QUERY = {
     "_type": "dict",
     "required": [],
+    "fields": {
+        "_type": "list",
+        "max_elements": 20,
+        "_items": {"_type": "enum", "values": QUIZ_FIELDS},
+    },
     "exclude": {
         "_type": "list",
         "max_elements": 20,
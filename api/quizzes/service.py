@@ -5,9 +5,12 @@ import api.database as database
 import api.quizzes.schema as schema
 from api.common.service import ServiceRequest, ServiceResponse
 from api.errors import api_error, ApiError
-from api.middlewares import require_auth, validate
+from api.middlewares import require_auth, validate, versioned
 import api.questions
 
+database.versions.track('quizzes')
+database.doc_cache.enable('quizzes')
+
 
 def _find_questions(questions_ids: List[int]) -> Optional[ServiceResponse]:
     found_questions = database.db.questions.find(
@@ -42,16 +45,24 @@ def add(r: ServiceRequest) -> ServiceResponse:
 
 
 @require_auth()
+@versioned('quizzes')
 def find(r: ServiceRequest) -> ServiceResponse:
     return database.find_with_query('quizzes', r.query)
 
 
 @require_auth()
+@versioned('quizzes')
 def find_one(r: ServiceRequest, quiz_id: int) -> ServiceResponse:
     return database.find_one_by_id('quizzes', quiz_id, r.query.projection,
                                    r.query.embed)
 
 
+@require_auth('mod')
+def export(r: ServiceRequest) -> ServiceResponse:
+    """Streams all matching quizzes as NDJSON."""
+    return database.stream_with_query('quizzes', r.query)
+
+
 @require_auth('mod')
 def delete(r: ServiceRequest, quiz_id: int) -> ServiceResponse:
     return database.delete_one('quizzes', quiz_id)
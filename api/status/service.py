@@ -1,9 +1,16 @@
+from pymongo.errors import PyMongoError
+
+from api.common import lru
 from api.common.service import ServiceRequest, ServiceResponse
 import api.database as db
 
 
 def get(r: ServiceRequest) -> ServiceResponse:
-    info = db.connect.client.server_info()
+    # Database is connected lazily, so it may be unreachable only now.
+    try:
+        info = db.connect.client.server_info()
+    except PyMongoError:
+        info = None
     if not info:
         return ServiceResponse(500, {"status": "FAILURE"})
-    return ServiceResponse(200, {"status": "OK"})
+    return ServiceResponse(200, {"status": "OK", "caches": lru.stats()})
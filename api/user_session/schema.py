@@ -1,3 +1,5 @@
+import api.database
+
 LOGIN = {
     '_type': 'dict',
     'required': ['email', 'password'],
@@ -11,3 +13,9 @@ LOGIN = {
         # 'pattern': r'^(?=.*[a-z])(?=.*[A-Z])(?=.*\d)(?=.*[@$!%*?&])[A-Za-z\d@$!%*?&]{8,32}$',
     }
 }
+
+# Every authenticated request with opaque token looks it up.
+api.database.Index('session_tokens', [('token', 1)], unique=True)
+# Sessions of user are deleted when account is blocked or deleted.
+api.database.Index('session_tokens', [('user_id', 1)])
+api.database.expiring('session_tokens')
@@ -4,16 +4,15 @@ from time import time
 from typing import Dict, Union
 
 import api.database
+from api import passwords
 from api.common.other import UserSession
 from api.common.service import ServiceRequest, ServiceResponse
 from api.errors import ApiError, api_error
-from api.middlewares import require_auth, validate
+from api.middlewares import (invalidate_session, require_auth, signed_tokens,
+                             validate)
 from api.user_session import schema
-from argon2 import PasswordHasher, exceptions
 from typing_extensions import TypedDict
 
-ph = PasswordHasher()
-
 
 def _generate_session_token(token_data: Dict):
     expire_time = int(time()) + 3 * 3600
@@ -25,6 +24,21 @@ def _generate_session_token(token_data: Dict):
     return token_data
 
 
+def _create_session(token_data: Dict) -> Dict:
+    """Signed tokens are not stored, opaque ones go to session_tokens."""
+    if signed_tokens.enabled():
+        token, exp = signed_tokens.issue(token_data['user_id'],
+                                         token_data['role'])
+        token_data['token'] = token
+        token_data['exp'] = exp
+        return token_data
+    session_token = _generate_session_token(token_data)
+    response = api.database.insert_one(
+        'session_tokens', api.database.with_expiry(session_token))
+    session_token['_id'] = response.response['id']
+    return session_token
+
+
 @validate(schema.LOGIN)
 def login(r: ServiceRequest) -> ServiceResponse:
     email = r.content['email']
@@ -42,33 +56,57 @@ def login(r: ServiceRequest) -> ServiceResponse:
         pass
     if (isinstance(blocked_to, int) and blocked_to > int(time())):
         return ServiceResponse(401, errors=api_error('account_blocked'))
+    # Field password can not be present when account is created by using
+    # Sign-In eith Google.
+    password_hash = user_account.get('password', '')
     try:
-        # Field password can not be present when account is created by using
-        # Sign-In eith Google.
-        ph.verify(user_account.get('password', ''), password)
-    except exceptions.VerifyMismatchError:
-        error = api_error('invalid_login_or_password')
-        return ServiceResponse(401, errors=error)
+        if not passwords.verify(password_hash, password):
+            error = api_error('invalid_login_or_password')
+            return ServiceResponse(401, errors=error)
+    except passwords.Saturated:
+        return ServiceResponse(503, errors=api_error('server_busy'))
+    try:
+        if passwords.needs_rehash(password_hash):
+            api.database.db.accounts.update_one(
+                {'_id': user_account['_id']},
+                {'$set': {
+                    'password': passwords.hash(password)
+                }})
+    except passwords.Saturated:
+        # Hash is updated on next login.
+        pass
 
     token_data = {
         'role': user_account['role'],
         'user_id': user_account['_id'],
     }
-    session_token = _generate_session_token(token_data)
-    api.database.insert_one('session_tokens', session_token)
+    session_token = _create_session(token_data)
     token = {'session_token': session_token['token']}
     return ServiceResponse(201, token)
 
 
 @require_auth()
 def logout(r: ServiceRequest) -> ServiceResponse:
-    return api.database.delete_one('session_tokens', r.user_session._id)
+    if signed_tokens.is_signed(r.user_session.token):
+        invalidate_session(r.user_session.token)
+        return ServiceResponse(204)
+    res = api.database.delete_one('session_tokens', r.user_session._id)
+    invalidate_session(r.user_session.token)
+    return res
 
 
 @require_auth()
 def get_token(r: ServiceRequest) -> ServiceResponse:
+    if signed_tokens.is_signed(r.user_session.token):
+        return ServiceResponse(
+            200, {
+                'role': r.user_session.role,
+                'user_id': r.user_session.user_id,
+                'exp': r.user_session.exp
+            })
     return api.database.find_one('session_tokens',
                                  {'token': r.user_session.token}, {
                                      '_id': False,
-                                     'token': False
+                                     'token': False,
+                                     api.database.EXPIRES_AT: False
                                  })
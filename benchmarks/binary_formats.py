@@ -0,0 +1,56 @@
+"""Compares JSON with MessagePack and CBOR (see api.common.formats).
+
+Payloads are questions listing (same as in json_codec.py) and account history
+listing. Sizes are given raw and gzipped, because big responses are compressed.
+
+Usage:
+PYTHONPATH=. python3 benchmarks/binary_formats.py [number_of_loops]
+"""
+
+import gzip
+import sys
+import timeit
+from typing import Dict, List
+
+from api.common import formats
+from json_codec import questions_listing_payload
+
+
+def history_listing_payload(limit: int = 200) -> List[Dict]:
+    """GET /accounts/me/history?limit=200"""
+    return [{
+        'quiz_id': i % 40,
+        'is_exam': bool(i % 3),
+        'out_of': 20 + i % 5,
+        'correct_answers': i % 20,
+        'started_at': 1594000000 + i * 3600,
+        'ended_at': 1594000000 + i * 3600 + 1200,
+    } for i in range(1, limit + 1)]
+
+
+def main(loops: int = 200):
+    payloads = {
+        'questions_listing': questions_listing_payload(),
+        'history_listing': history_listing_payload(),
+    }
+    print(f'{"format":<22} {"payload":<18} {"size":>8} {"gzipped":>8} '
+          f'{"loads us":>10} {"dumps us":>10}')
+    for mimetype in (formats.JSON, formats.MSGPACK, formats.CBOR):
+        if not formats.is_supported(mimetype):
+            print(f'{mimetype:<22} not available')
+            continue
+        for payload_name, payload in payloads.items():
+            raw = formats.dumps(mimetype, payload)
+            if isinstance(raw, str):
+                raw = raw.encode()
+            loads = timeit.timeit(lambda: formats.loads(mimetype, raw),
+                                  number=loops)
+            dumps = timeit.timeit(lambda: formats.dumps(mimetype, payload),
+                                  number=loops)
+            print(f'{mimetype:<22} {payload_name:<18} {len(raw):>8} '
+                  f'{len(gzip.compress(raw, 6)):>8} '
+                  f'{loads / loops * 1e6:>10.1f} {dumps / loops * 1e6:>10.1f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,55 @@
+"""Hammers wrappers.insert_one from many processes and checks that every
+inserted document got a unique _id (see api.database.ids).
+
+Needs running database, DATABASE_URI points to it. Documents are inserted
+into ids_stress collection, which is dropped before and after the run.
+Exit code is 1 when any _id was given twice or insert failed.
+
+Usage:
+DATABASE_URI=mongodb://localhost:27017/PreExam PYTHONPATH=. \\
+    python3 benchmarks/insert_ids.py [processes] [inserts_per_process]
+"""
+
+import multiprocessing
+import sys
+import time
+from typing import List
+
+COLLECTION = 'ids_stress'
+
+
+def _insert(count: int) -> List[int]:
+    # Every process has its own client and id blocks, like gunicorn workers.
+    import api.database
+    return [
+        api.database.insert_one(COLLECTION, {'n': i}).response['id']
+        for i in range(count)
+    ]
+
+
+def main(processes: int = 8, inserts: int = 500):
+    import api.database
+    api.database.db[COLLECTION].drop()
+    api.database.db.counters.delete_one({'_id': COLLECTION})
+    # Documents inserted without counters, eg. by older version of the API.
+    api.database.db[COLLECTION].insert_many([{'_id': i} for i in range(1, 6)])
+
+    start = time.perf_counter()
+    with multiprocessing.get_context('spawn').Pool(processes) as pool:
+        results = pool.map(_insert, [inserts] * processes)
+    elapsed = time.perf_counter() - start
+
+    given = [i for result in results for i in result]
+    stored = api.database.db[COLLECTION].count_documents({})
+    duplicates = len(given) - len(set(given))
+    print(f'{processes} processes, {len(given)} inserts in {elapsed:.2f} s '
+          f'({len(given) / elapsed:.0f}/s), {duplicates} duplicated ids, '
+          f'{stored - 5} stored')
+    api.database.db[COLLECTION].drop()
+    api.database.db.counters.delete_one({'_id': COLLECTION})
+    if duplicates or stored - 5 != len(given):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,88 @@
+"""Micro-benchmark of JSON backends available to api.common.codec.
+
+Payloads mimic real traffic: BULK_ANSWER submission (decoding on the way in)
+and questions listing with embeded author and category (encoding on the way out).
+
+Usage:
+python3 benchmarks/json_codec.py [number_of_loops]
+"""
+
+import sys
+import timeit
+from typing import Dict, List
+
+from api.common import codec
+
+
+def bulk_answer_payload(questions: int = 100) -> List[Dict]:
+    """Exam submission with answers to every question, some with sub answers."""
+    payload: List[Dict] = []
+    for i in range(1, questions + 1):
+        if i % 5 == 0:
+            payload.append({
+                'question_id': i,
+                'sub_answers': [{
+                    'question_id': j,
+                    'answer_indexes': [j % 4]
+                } for j in range(1, 5)],
+            })
+        else:
+            payload.append({'question_id': i, 'answer_indexes': [i % 4, 3]})
+    return payload
+
+
+def questions_listing_payload(limit: int = 200) -> List[Dict]:
+    """GET /questions?limit=200&embed=author,category"""
+    return [{
+        '_id': i,
+        'category_id': i % 17,
+        'text': 'Oblicz pole trójkąta prostokątnego o przyprostokątnych a i b. ' * 3,
+        'content': 'Treść zadania z polskimi znakami: ąćęłńóśźż. ' * 10,
+        'answers': ['ab/2', 'a*b', '2ab', 'a+b'],
+        'correct_answers': [0],
+        'hint': 'Wzór na pole trójkąta.',
+        'view_correct_answers': bool(i % 2),
+        'created_at': 1594000000 + i,
+        'category': {
+            '_id': i % 17,
+            'name': 'Geometria',
+            'parent_id': 1,
+            'main_parent_id': 1
+        },
+        'author': {
+            '_id': 3,
+            'username': 'nauczyciel',
+            'name': 'Jan',
+            'last_name': 'Kowalski',
+            'role': 'mod'
+        },
+    } for i in range(1, limit + 1)]
+
+
+def main(loops: int = 200):
+    payloads = {
+        'bulk_answer': bulk_answer_payload(),
+        'questions_listing': questions_listing_payload(),
+    }
+    print(f'Active backend: {codec.backend}')
+    print(f'{"backend":<8} {"payload":<18} {"size":>8} '
+          f'{"loads us":>10} {"dumps us":>10}')
+    for name, factory in codec._BACKENDS.items():
+        try:
+            backend = factory()
+        except ImportError:
+            print(f'{name:<8} not installed')
+            continue
+        for payload_name, payload in payloads.items():
+            raw = backend['dumps'](payload)
+            if isinstance(raw, str):
+                raw = raw.encode()
+            loads = timeit.timeit(lambda: backend['loads'](raw), number=loops)
+            dumps = timeit.timeit(lambda: backend['dumps'](payload),
+                                  number=loops)
+            print(f'{name:<8} {payload_name:<18} {len(raw):>8} '
+                  f'{loads / loops * 1e6:>10.1f} {dumps / loops * 1e6:>10.1f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,111 @@
+"""Login throughput against latency of ordinary requests under mixed load.
+
+Server is simulated by a pool of request threads. Login clients send logins
+(argon2 verify) back to back and a few other clients send ordinary requests
+(encoding questions listing). Both modes are run:
+
+inline - verify is done in request thread like before api.passwords,
+pool   - api.passwords.verify, which answers 503 when pool is saturated.
+
+Argon2 parameters and pool size are read from the same env vars as by the API
+(API_ARGON2_*, API_PASSWORD_WORKERS, API_PASSWORD_QUEUE).
+
+Usage:
+PYTHONPATH=. python3 benchmarks/passwords.py [seconds] [login_clients]
+"""
+
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+from api import passwords
+from api.common import codec
+from json_codec import questions_listing_payload
+
+REQUEST_THREADS = 16
+ORDINARY_CLIENTS = 2
+
+PASSWORD = 'Tajne-Haslo-123'
+PASSWORD_HASH = passwords.hasher.hash(PASSWORD)
+LISTING = questions_listing_payload(50)
+
+
+def inline_login() -> int:
+    passwords.hasher.verify(PASSWORD_HASH, PASSWORD)
+    return 201
+
+
+def pool_login() -> int:
+    try:
+        passwords.verify(PASSWORD_HASH, PASSWORD)
+    except passwords.Saturated:
+        return 503
+    return 201
+
+
+def ordinary() -> int:
+    codec.dumps(LISTING)
+    return 200
+
+
+def run(login: Callable[[], int], seconds: float,
+        login_clients: int) -> Dict[str, float]:
+    server = ThreadPoolExecutor(REQUEST_THREADS)
+    stop = threading.Event()
+    codes: List[int] = []
+    latencies: List[float] = []
+
+    def login_client():
+        while not stop.is_set():
+            code = server.submit(login).result()
+            codes.append(code)
+            if code == 503:
+                # Client backs off before trying again.
+                time.sleep(0.1)
+
+    def ordinary_client():
+        while not stop.is_set():
+            start = time.perf_counter()
+            server.submit(ordinary).result()
+            latencies.append(time.perf_counter() - start)
+            time.sleep(0.005)
+
+    clients = [threading.Thread(target=login_client)
+               for _ in range(login_clients)]
+    clients += [threading.Thread(target=ordinary_client)
+                for _ in range(ORDINARY_CLIENTS)]
+    for client in clients:
+        client.start()
+    time.sleep(seconds)
+    stop.set()
+    for client in clients:
+        client.join()
+    server.shutdown()
+
+    latencies.sort()
+    return {
+        'logins/s': codes.count(201) / seconds,
+        '503/s': codes.count(503) / seconds,
+        'p50 ms': statistics.median(latencies) * 1000,
+        'p99 ms': latencies[int(len(latencies) * 0.99)] * 1000,
+    }
+
+
+def main(seconds: float = 5, login_clients: int = 32):
+    print(f'request threads: {REQUEST_THREADS}, password workers: '
+          f'{passwords.WORKERS}, queue: {passwords.QUEUE}, '
+          f'login clients: {login_clients}')
+    print(f'{"mode":<8} {"logins/s":>9} {"503/s":>9} '
+          f'{"ordinary p50 ms":>16} {"ordinary p99 ms":>16}')
+    for mode, login in (('inline', inline_login), ('pool', pool_login)):
+        result = run(login, seconds, login_clients)
+        print(f'{mode:<8} {result["logins/s"]:>9.1f} {result["503/s"]:>9.1f} '
+              f'{result["p50 ms"]:>16.2f} {result["p99 ms"]:>16.2f}')
+
+
+if __name__ == '__main__':
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 5,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 32)
@@ -0,0 +1,249 @@
+"""Micro-benchmark of api.middlewares.validator over real resource schemas.
+
+For every schema three documents are generated from the schema itself:
+min     - required fields only (or a few fields if none is required),
+max     - every field, lists with max_elements items, strings of max length,
+invalid - every field of wrong type, unknown fields, full lists (many errors).
+
+Reports checks per second and peak memory allocated by one check() and compares
+ops/s with stored baseline. Exit code is 1 when any case is slower than
+baseline by more than threshold.
+
+Every case is timed in several passes over all cases, each pass taking min of
+--repeat short runs, and the best pass is kept, so load spikes hitting one
+case don't count. Still, on a shared VM best ops/s of a case differed by up
+to 35% between runs, so default threshold is 0.5. It catches losing fast paths
+of the compiled validator (several times slower), not small regressions. Use
+lower threshold and more passes on a quiet machine.
+
+Baseline is machine specific, record it with --save-baseline on the machine
+used for comparisons, with the same passes and repeat as used for checks.
+Needs installed requirements, but not running database.
+
+Usage:
+PYTHONPATH=. python3 benchmarks/validator.py [--save-baseline] [--threshold 0.5]
+    [--passes 5] [--repeat 5]
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import pathlib
+import re
+import string
+import sys
+import timeit
+import tracemalloc
+from typing import Any, Dict, List, Optional, Tuple
+
+# Mongo client connects lazily, so any database name is fine.
+os.environ.setdefault('DATABASE_URI', 'mongodb://localhost:27017/PreExam')
+
+from api.middlewares.validator import Schema, check  # noqa: E402
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+BASELINE = pathlib.Path(__file__).resolve().parent / 'validator_baseline.json'
+
+SCHEMAS = {
+    'questions': [
+        'QUESTION', 'UPDATE_QUESTION', 'QUESTIONS_QUERY',
+        'SINGLE_QUESTION_QUERY', 'QUESTIONS_EXPORT_QUERY'
+    ],
+    'quizzes': [
+        'QUIZ', 'SINGLE_ANSWER', 'BULK_ANSWER', 'QUIZZES_QUERY',
+        'SINGLE_QUIZ_QUERY', 'QUIZZES_EXPORT_QUERY'
+    ],
+    'accounts': ['ACCOUNT', 'HISTORY_QUERY'],
+    'categories': ['CATEGORIES_QUERY', 'SINGLE_CATEGORY_QUERY'],
+    'admin': ['ACCOUNTS_QUERY', 'ACCOUNTS_EXPORT_QUERY'],
+}
+
+# Seconds of one timed run. Short runs are less likely to be hit by load spikes
+# and leave time for more of them.
+RUN_TIME = 0.05
+
+# Values matching patterns used in schemas. Letters can be appended to all of
+# them except the activation code.
+SAMPLES = {
+    r'^\S+?@\S+?\.\S+?$': 'jan@kowalski.pl',
+    r'^[a-źA-Ź]+?$': 'Jan',
+    r'^[a-źA-Ź-._0-9]+?$': 'jan_k',
+    r'^[0-9]{3}-[0-9]{3}-[0-9]{3}$': '123-456-789',
+    r'[a-z0-9]': 'abc123',
+    r'^/': '/questions',
+}
+
+# Wrong type for every schema type.
+INVALID = {
+    'dict': 'x',
+    'list': 'x',
+    'str': 1,
+    'int': 'x',
+    'enum': '?',
+    'bool': 'x',
+    'any': None,
+}
+
+
+def _load_schemas() -> Dict[str, Schema]:
+    """Loads schema modules by path, so services (and their env vars) are not
+    imported."""
+    schemas = {}
+    for resource, names in SCHEMAS.items():
+        path = ROOT / 'api' / resource / 'schema.py'
+        spec = importlib.util.spec_from_file_location(
+            f'api.{resource}.schema', path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)  # type: ignore
+        for name in names:
+            schemas[name] = getattr(module, name)
+    return schemas
+
+
+def _suffix(i: int) -> str:
+    """Unique letters for i-th list element eg. 'a', 'b', ..., 'ba'."""
+    letters = ''
+    while True:
+        letters = string.ascii_lowercase[i % 26] + letters
+        i //= 26
+        if not i:
+            return letters
+
+
+def _string(schema: Schema, size: str, i: Optional[int]) -> str:
+    pattern = schema.get('pattern')
+    sample = SAMPLES.get(pattern, 'abc')
+    # Suffixes are lowercase, so padding with 'A' keeps values unique.
+    suffix = _suffix(i) if i is not None else ''
+    limit = schema.get('max')
+    value = (sample[:limit - len(suffix)] if limit else sample) + suffix
+    target = (limit if size == 'max' else schema.get('min')) or 0
+    padded = value.ljust(target, 'A')
+    return padded if not pattern or re.match(pattern, padded) else value
+
+
+def _list(schema: Schema, size: str) -> List[Any]:
+    items = schema['_items']
+    length = schema['max_elements'] if size != 'min' else 1
+    # Scalars must be unique.
+    if items['_type'] == 'enum':
+        length = min(length, len(items['values']))
+    if items['_type'] == 'int' and items.get('max') is not None:
+        length = min(length, items['max'] - (items.get('min') or 0) + 1)
+    if items['_type'] == 'bool':
+        length = min(length, 2)
+    return [generate(items, size, i) for i in range(length)]
+
+
+def generate(schema: Schema, size: str, i: Optional[int] = None) -> Any:
+    _type = schema['_type']
+    if size == 'invalid' and _type not in ('dict', 'list'):
+        return INVALID[_type]
+    if _type == 'dict':
+        fields = [k for k in schema if k not in ('_type', 'required')]
+        if size == 'min':
+            required = [k for k in schema['required'] if isinstance(k, str)]
+            fields = required or fields[:3]
+        document = {k: generate(schema[k], size) for k in fields}
+        if size == 'invalid':
+            document['unknown'] = 1
+        return document
+    if _type == 'list':
+        return _list(schema, size)
+    if _type == 'str':
+        return _string(schema, size, i)
+    if _type == 'int':
+        low = schema.get('min') or 0
+        value = low + (i or 0)
+        return min(value, schema['max']) if schema.get('max') else value
+    if _type == 'enum':
+        return schema['values'][(i or 0) % len(schema['values'])]
+    if _type == 'bool':
+        return bool((i or 0) % 2)
+    return {'method': 'GET'}
+
+
+def _timer(document: Any, schema: Schema) -> Tuple[timeit.Timer, int]:
+    """Timer of one check() and number of checks taking about RUN_TIME."""
+    timer = timeit.Timer(lambda: check(document, schema))
+    number, took = timer.autorange()
+    return timer, max(1, round(number * RUN_TIME / took))
+
+
+def _ops_per_second(timer: timeit.Timer, number: int, repeat: int) -> float:
+    return number / min(timer.repeat(repeat=repeat, number=number))
+
+
+def _peak_memory(document: Any, schema: Schema) -> int:
+    tracemalloc.start()
+    check(document, schema)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--threshold',
+                        type=float,
+                        default=0.5,
+                        help='Allowed slowdown, 0.5 means 50%%.')
+    parser.add_argument('--passes',
+                        type=int,
+                        default=5,
+                        help='Passes over all cases, best one is kept.')
+    parser.add_argument('--repeat',
+                        type=int,
+                        default=5,
+                        help='Timed runs of a case in one pass.')
+    args = parser.parse_args()
+
+    baseline = json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+    cases = {}
+    for name, schema in _load_schemas().items():
+        for size in ('min', 'max', 'invalid'):
+            document = generate(schema, size)
+            errors = check(document, schema)
+            if size != 'invalid' and errors:
+                print(f'{name} {size} document is not valid: {errors[0]}')
+            # Schemas are compiled on first check(), so it is not timed.
+            cases[f'{name}/{size}'] = (document, schema, len(errors),
+                                       *_timer(document, schema))
+
+    results: Dict[str, float] = {}
+    for _ in range(args.passes):
+        for key, (_, _, _, timer, number) in cases.items():
+            ops = _ops_per_second(timer, number, args.repeat)
+            results[key] = round(max(ops, results.get(key, 0)), 1)
+
+    regressions = []
+    print(f'{"schema":<24} {"case":<8} {"errors":>6} {"ops/s":>10} '
+          f'{"peak KiB":>9} {"baseline":>10} {"change":>7}')
+    for key, (document, schema, errors, _, _) in cases.items():
+        name, size = key.split('/')
+        ops = results[key]
+        peak = _peak_memory(document, schema)
+
+        change = ''
+        if key in baseline:
+            ratio = ops / baseline[key] - 1
+            change = f'{ratio:+.0%}'
+            if ratio < -args.threshold:
+                regressions.append(key)
+        print(f'{name:<24} {size:<8} {errors:>6} {ops:>10.0f} '
+              f'{peak / 1024:>9.1f} {baseline.get(key, 0):>10.0f} '
+              f'{change:>7}')
+
+    if args.save_baseline:
+        BASELINE.write_text(json.dumps(results, indent=2) + '\n')
+        print(f'Baseline saved to {BASELINE}')
+    if regressions:
+        print(f'Slower than baseline by more than {args.threshold:.0%}: '
+              + ', '.join(regressions))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
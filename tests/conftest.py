@@ -0,0 +1,43 @@
+"""Tests import api modules without running services, so env vars required
+at import time get dummy values. Database client is created lazily, so
+nothing connects unless a test needs database (see database fixture).
+
+Tests using database run against TEST_DATABASE_URI (a throwaway database,
+it is dropped) or against mongomock when it is installed. Without either
+they are skipped.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('DATABASE_URI',
+                      os.environ.get('TEST_DATABASE_URI',
+                                     'mongodb://localhost:27017/TheSchoolest'))
+os.environ.setdefault('API_IMAGES_DIR', tempfile.gettempdir())
+
+
+@pytest.fixture
+def database(monkeypatch):
+    """Empty database used by api.database.connect for the test."""
+    import pymongo
+    from api.database import connect
+
+    uri = os.environ.get('TEST_DATABASE_URI')
+    if uri:
+        client = pymongo.MongoClient(uri)
+    else:
+        mongomock = pytest.importorskip('mongomock')
+        client = mongomock.MongoClient()
+    name = f'test_{os.getpid()}'
+    client.drop_database(name)
+    monkeypatch.setattr(connect, '_client', client)
+    monkeypatch.setattr(connect, '_database', client[name])
+    monkeypatch.setattr(connect, '_secondary_database', client[name])
+    monkeypatch.setattr(connect, '_pid', os.getpid())
+    yield client[name]
+    client.drop_database(name)
@@ -0,0 +1,92 @@
+"""Failures of single sub-requests of POST /batch don't fail whole batch."""
+
+import time
+
+import pytest
+from flask import Flask
+
+from api.batch.service import _dispatch, run
+from api.common import ServiceResponse, rest
+
+# Documents given out by _export.
+exported = []
+
+
+def _ok(r):
+    return ServiceResponse(200, {'ok': True})
+
+
+def _broken(r):
+    raise RuntimeError('broken view')
+
+
+def _export(r):
+    def documents():
+        for i in range(1000):
+            exported.append(i)
+            yield {'_id': i}
+
+    return ServiceResponse(200, documents(), content_type=rest.NDJSON)
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    for url, endpoint, view, method in [
+            rest.get('/ok', _ok),
+            rest.get('/broken', _broken),
+            rest.get('/export', _export),
+            rest.post('/batch', run)
+    ]:
+        app.add_url_rule(url, endpoint, view, methods=[method])
+    return app
+
+
+def _run(app, method, path):
+    with app.app_context():
+        return _dispatch(app, {'method': method, 'path': path}, 'token', {},
+                         None)
+
+
+def test_sub_request(app):
+    result = _run(app, 'GET', '/ok')
+    assert result['status'] == 200
+    assert result['body'] == {'ok': True}
+
+
+def test_exception_of_view_fails_only_its_item(app):
+    result = _run(app, 'GET', '/broken')
+    assert result['status'] == 500
+    assert [e['name'] for e in result['body']] == ['internal_error']
+
+
+@pytest.mark.parametrize('method, path, status, error', [
+    ('GET', '/missing', 404, 'resource_not_found'),
+    ('DELETE', '/ok', 405, 'method_not_allowed'),
+])
+def test_routing_errors(app, method, path, status, error):
+    result = _run(app, method, path)
+    assert result['status'] == status
+    assert [e['name'] for e in result['body']] == [error]
+
+
+def test_streamed_response_is_not_read(app):
+    exported.clear()
+    result = _run(app, 'GET', '/export')
+    assert result['status'] == 422
+    assert [e['name'] for e in result['body']] == ['batch_response_not_json']
+    assert exported == []
+
+
+def test_empty_batch(app, database):
+    database.session_tokens.insert_one({
+        '_id': 1,
+        'token': 'batch_token',
+        'user_id': 1,
+        'exp': int(time.time()) + 3600,
+        'role': 'user'
+    })
+    response = app.test_client().post(
+        '/batch', json=[], headers={'Authorization': 'Bearer batch_token'})
+    assert response.status_code == 200
+    assert response.get_json() == []
@@ -0,0 +1,68 @@
+"""304 responses repeat ETag and Vary of the representation client has."""
+
+import pytest
+from flask import Flask
+
+from api.common import ServiceResponse, rest
+
+DOCUMENTS = [{'_id': i, 'text': 'x' * 50} for i in range(100)]
+VERSION_ETAG = '"vabc"'
+
+
+def _listing(r):
+    return ServiceResponse(200, DOCUMENTS)
+
+
+def _versioned(r):
+    # Like services decorated with @versioned.
+    if VERSION_ETAG in r.if_none_match or '"vabc-gzip"' in r.if_none_match:
+        return ServiceResponse(304, etag=VERSION_ETAG)
+    return ServiceResponse(200, DOCUMENTS, etag=VERSION_ETAG)
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    for url, endpoint, view, method in [
+            rest.get('/listing', _listing),
+            rest.get('/versioned', _versioned)
+    ]:
+        app.add_url_rule(url, endpoint, view, methods=[method])
+    return app.test_client()
+
+
+@pytest.mark.parametrize('url', ['/listing', '/versioned'])
+def test_not_modified_repeats_encoded_etag(client, url):
+    first = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert first.headers['Content-Encoding'] == 'gzip'
+    encoded = first.headers['ETag']
+    assert encoded.endswith('-gzip"')
+
+    second = client.get(url,
+                        headers={
+                            'Accept-Encoding': 'gzip',
+                            'If-None-Match': encoded
+                        })
+    assert second.status_code == 304
+    assert second.headers['ETag'] == encoded
+    assert 'Accept-Encoding' in second.headers['Vary']
+    assert 'Accept' in second.headers['Vary']
+
+
+@pytest.mark.parametrize('url', ['/listing', '/versioned'])
+def test_not_modified_repeats_plain_etag(client, url):
+    plain = client.get(url).headers['ETag']
+    assert not plain.endswith('-gzip"')
+    second = client.get(url, headers={'If-None-Match': plain})
+    assert second.status_code == 304
+    assert second.headers['ETag'] == plain
+    assert 'Accept-Encoding' in second.headers['Vary']
+
+
+def test_encoded_tag_without_accepted_encoding_gets_plain_etag(client):
+    encoded = client.get('/listing', headers={
+        'Accept-Encoding': 'gzip'
+    }).headers['ETag']
+    second = client.get('/listing', headers={'If-None-Match': encoded})
+    assert second.status_code == 304
+    assert second.headers['ETag'] == encoded[:-len('-gzip"')] + '"'
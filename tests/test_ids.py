@@ -0,0 +1,108 @@
+"""Ids allocated by api.database.ids are unique across allocators sharing
+counters collection, and reserved blocks are given out without holes."""
+
+import importlib.util
+import multiprocessing
+import os
+import threading
+
+import pytest
+
+from api.database import ids
+
+COLLECTION = 'ids_test'
+
+
+def _allocator():
+    """Fresh copy of api.database.ids with its own blocks and lock, like the
+    module in other gunicorn worker."""
+    spec = importlib.util.spec_from_file_location('_ids_copy', ids.__file__)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)  # type: ignore
+    return module
+
+
+def _allocate(allocators, threads, batches, sizes):
+    """Each thread of each allocator calls next_ids for every size in sizes,
+    batches times. Returns all given ids."""
+    given = []
+    given_lock = threading.Lock()
+    errors = []
+
+    def run(allocator):
+        try:
+            result = []
+            for _ in range(batches):
+                for size in sizes:
+                    result += allocator.next_ids(COLLECTION, size)
+            with given_lock:
+                given.extend(result)
+        except Exception as e:
+            errors.append(e)
+
+    workers = [
+        threading.Thread(target=run, args=(allocator, ))
+        for allocator in allocators for _ in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert not errors
+    return given
+
+
+def test_next_ids_in_one_allocator(database, monkeypatch):
+    allocator = _allocator()
+    monkeypatch.setattr(allocator, 'BLOCK_SIZE', 5)
+    assert allocator.next_ids(COLLECTION, 3) == [1, 2, 3]
+    assert allocator.next_ids(COLLECTION, 4) == [4, 5, 6, 7]
+    assert allocator.next_id(COLLECTION) == 8
+    # Bigger than a block, reserved exactly.
+    assert allocator.next_ids(COLLECTION, 12) == list(range(9, 21))
+    assert database.counters.find_one({'_id': COLLECTION})['last'] == 20
+
+
+def test_counter_starts_after_existing_ids(database):
+    database[COLLECTION].insert_many([{'_id': 7}, {'_id': 'x'}, {'_id': 3}])
+    assert _allocator().next_id(COLLECTION) == 8
+
+
+def test_concurrent_allocators_give_unique_ids(database, monkeypatch):
+    allocators = [_allocator() for _ in range(4)]
+    for allocator in allocators:
+        monkeypatch.setattr(allocator, 'BLOCK_SIZE', 10)
+    # 4 allocators * 3 threads * 10 batches * 10 ids, every reserved block
+    # is used up.
+    given = _allocate(allocators, threads=3, batches=10, sizes=[1, 2, 3, 4])
+    assert len(given) == 1200
+    assert len(set(given)) == len(given)
+    # No block was reserved twice or skipped.
+    assert sorted(given) == list(range(1, 1201))
+    assert database.counters.find_one({'_id': COLLECTION})['last'] == 1200
+
+
+def test_resync_moves_past_ids_inserted_without_counters(database):
+    allocator = _allocator()
+    assert allocator.next_id(COLLECTION) == 1
+    database[COLLECTION].insert_one({'_id': 500})
+    allocator.resync(COLLECTION)
+    assert allocator.next_id(COLLECTION) == 501
+
+
+def _allocate_in_process(count):
+    # Fresh interpreter, like a gunicorn worker with its own client.
+    from api.database import ids
+    return [ids.next_id(COLLECTION) for _ in range(count)]
+
+
+@pytest.mark.skipif(not os.environ.get('TEST_DATABASE_URI'),
+                    reason='processes need a real database')
+def test_processes_give_unique_ids(database, monkeypatch):
+    monkeypatch.setenv('DATABASE_URI', os.environ['TEST_DATABASE_URI'])
+    monkeypatch.setenv('DATABASE_NAME', database.name)
+    monkeypatch.setenv('API_ID_BLOCK_SIZE', '7')
+    with multiprocessing.get_context('spawn').Pool(4) as pool:
+        results = pool.map(_allocate_in_process, [70] * 4)
+    given = [i for result in results for i in result]
+    assert sorted(given) == list(range(1, 281))
@@ -0,0 +1,142 @@
+"""Shape of aggregation pipelines built by api.database.planner."""
+
+from api.database import planner
+from api.database.embed import Embed
+
+CATEGORY = Embed('test_category', 'category_id', 'categories')
+AUTHOR = Embed('test_author', 'author_id', 'accounts')
+SORT = {'created_at': -1, '_id': 1}
+
+
+def _operators(stages):
+    return [next(iter(s)) for s in stages]
+
+
+def _page_shape(stages):
+    """Operators from $sort to the end."""
+    operators = _operators(stages)
+    return operators[operators.index('$sort'):]
+
+
+def test_own_filter_is_matched_before_lookups():
+    stages = planner.plan({'title': 'a'}, SORT, 0, 10, [CATEGORY, AUTHOR])
+    assert stages[0] == {'$match': {'title': 'a'}}
+    assert _operators(stages)[1:4] == ['$sort', '$skip', '$limit']
+    # Lookups of one page only.
+    assert [s['$lookup']['as'] for s in stages if '$lookup' in s] == [
+        'test_category', 'test_author'
+    ]
+    assert _operators(stages).index('$lookup') > _operators(stages).index(
+        '$limit')
+
+
+def test_embed_filter_is_matched_after_its_lookup():
+    _filter = {'title': 'a', 'test_category.name': 'Fizyka'}
+    stages = planner.plan(_filter, SORT, 20, 10, [CATEGORY, AUTHOR])
+    assert stages[:3] == [
+        {'$match': {'title': 'a'}},
+        {'$lookup': CATEGORY.to_query()},
+        {'$match': {'test_category.name': 'Fizyka'}},
+    ]
+    assert stages[3:6] == [{'$sort': SORT}, {'$skip': 20}, {'$limit': 10}]
+    # Not filtered embed is looked up after limit.
+    assert stages.index({'$lookup': AUTHOR.to_query()}) > 5
+    assert {'$lookup': CATEGORY.to_query()} not in stages[4:]
+
+
+def test_embed_sort_is_looked_up_before_sort():
+    stages = planner.plan({}, {'test_author.name': 1, '_id': 1}, 0, 10,
+                          [AUTHOR])
+    assert _operators(stages)[:4] == ['$lookup', '$sort', '$skip', '$limit']
+
+
+def test_or_with_embed_field_is_kept_whole():
+    _filter = {'$or': [{'title': 'a'}, {'test_category.name': 'b'}]}
+    stages = planner.plan(_filter, SORT, 0, 10, [CATEGORY])
+    assert stages[:2] == [{'$lookup': CATEGORY.to_query()}, {'$match': _filter}]
+
+
+def test_facet_sorts_only_page():
+    _filter = {'title': 'a', 'test_category.name': 'Fizyka'}
+    stages = planner.plan(_filter, SORT, 0, 10, [CATEGORY, AUTHOR], count=True)
+    assert _operators(stages) == ['$match', '$lookup', '$match', '$facet']
+    facet = stages[-1]['$facet']
+    assert facet['total'] == [{'$count': 'total_count'}]
+    assert facet['page'][:3] == [{
+        '$sort': SORT
+    }, {
+        '$skip': 0
+    }, {
+        '$limit': 10
+    }]
+    assert {'$lookup': AUTHOR.to_query()} in facet['page']
+
+
+def test_page_shape_is_the_same_with_and_without_count():
+    args = ({'test_category.name': 'F'}, SORT, 5, 10, [CATEGORY, AUTHOR])
+    plain = planner.plan(*args)
+    counted = planner.plan(*args, count=True)
+    assert counted[:-1] + counted[-1]['$facet']['page'] == plain
+    assert _page_shape(plain)[:3] == ['$sort', '$skip', '$limit']
+
+
+def test_count_pipeline_honours_filter():
+    _filter = {'title': 'a', 'test_category.name': 'Fizyka'}
+    stages = planner.count_pipeline(_filter, [CATEGORY, AUTHOR])
+    assert stages == [
+        {'$match': {'title': 'a'}},
+        {'$lookup': CATEGORY.to_query()},
+        {'$match': {'test_category.name': 'Fizyka'}},
+        {'$count': 'total_count'},
+    ]
+
+
+def test_count_pipeline_without_filter():
+    assert planner.count_pipeline({}, [CATEGORY]) == [{
+        '$count': 'total_count'
+    }]
+
+
+def test_inclusive_projection_keeps_embeds():
+    stages = planner.plan({}, SORT, 0, 10, [CATEGORY], {
+        'title': True,
+        'test_category.name': True
+    })
+    assert {'$project': {'title': True, 'test_category': True}} in stages
+
+
+def test_embeds_only_filtered_on_are_removed():
+    stages = planner.plan({'test_category.name': 'F'}, SORT, 0, 10,
+                          [CATEGORY],
+                          keep_embeds=False)
+    assert stages[-1] == {'$project': {'test_category': False}}
+
+
+def test_unpack():
+    assert planner.unpack([]) == ([], 0)
+    assert planner.unpack([{'page': [], 'total': []}]) == ([], 0)
+    assert planner.unpack([{
+        'page': [{'_id': 1}],
+        'total': [{'total_count': 7}]
+    }]) == ([{'_id': 1}], 7)
+
+
+def test_facet_counts_filtered_documents(database):
+    database.categories.insert_many([{'_id': 1, 'name': 'Fizyka'},
+                                     {'_id': 2, 'name': 'Chemia'}])
+    database.questions.insert_many([{
+        '_id': i,
+        'category_id': 1 + i % 2,
+        'created_at': i
+    } for i in range(1, 26)])
+    stages = planner.plan({'test_category.name': 'Fizyka'}, SORT, 2, 5,
+                          [CATEGORY],
+                          count=True)
+    page, total = planner.unpack(list(database.questions.aggregate(stages)))
+    assert total == 12
+    assert [d['_id'] for d in page] == [20, 18, 16, 14, 12]
+    assert planner.total_count(
+        list(
+            database.questions.aggregate(
+                planner.count_pipeline({'test_category.name': 'Fizyka'},
+                                       [CATEGORY])))) == 12
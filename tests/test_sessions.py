@@ -0,0 +1,47 @@
+"""Logout revokes only its own token in session caches of all workers."""
+
+import time
+
+import pytest
+
+from api.common.lru import LRUCache
+from api.database import versions
+from api.middlewares import authentication, signed_tokens
+
+
+@pytest.fixture
+def sessions(database, monkeypatch):
+    monkeypatch.setattr(authentication, '_sessions',
+                        LRUCache('test_sessions', 16, ttl=60))
+    monkeypatch.setattr(signed_tokens, '_revoked', (-1, set(), {}))
+    monkeypatch.setattr(versions, '_local', {})
+    exp = int(time.time()) + 3600
+    database.session_tokens.insert_many([{
+        '_id': i,
+        'token': f'token{i}',
+        'user_id': i,
+        'exp': exp,
+        'role': 'user'
+    } for i in (1, 2)])
+    for i in (1, 2):
+        assert authentication._find_session(f'token{i}').user_id == i
+    return database
+
+
+def test_logout_in_this_worker(sessions):
+    sessions.session_tokens.delete_one({'_id': 1})
+    authentication.invalidate_session('token1')
+    assert authentication._find_session('token1') is None
+    assert authentication._find_session('token2').user_id == 2
+
+
+def test_logout_in_other_worker(sessions):
+    version = versions.get(authentication.SESSIONS)
+    # What invalidate_session of other worker leaves in database, this
+    # worker still has both sessions cached.
+    sessions.session_tokens.delete_many({})
+    signed_tokens.revoke_opaque('token1', int(time.time()) + 61)
+    assert authentication._find_session('token1') is None
+    # Cached session of other token is kept.
+    assert authentication._find_session('token2').user_id == 2
+    assert versions.get(authentication.SESSIONS) == version
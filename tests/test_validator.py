@@ -0,0 +1,191 @@
+"""Compiled validator must report the same errors, in the same order, as the
+former stack based interpreter (reference_validator) for every resource
+schema. Documents are generated from schemas with fixed seeds, mostly valid
+shapes with wrong types, unknown fields, duplicates and too long lists mixed
+in."""
+
+import copy
+import glob
+import importlib.util
+import os
+import random
+
+import pytest
+
+import reference_validator
+from api.middlewares import validator
+
+DOCUMENTS_PER_SCHEMA = 300
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _load_schemas():
+    """Schemas from api/*/schema.py. Files are loaded by path, packages of
+    resources import services which need mail and OAuth configuration."""
+    schemas = {}
+    for path in sorted(glob.glob(os.path.join(_ROOT, 'api', '*', 'schema.py'))):
+        resource = os.path.basename(os.path.dirname(path))
+        spec = importlib.util.spec_from_file_location(f'_schema_{resource}',
+                                                      path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)  # type: ignore
+        for name, value in vars(module).items():
+            if name.isupper() and isinstance(value, dict) and '_type' in value:
+                schemas[f'{resource}.{name}'] = value
+    return schemas
+
+
+SCHEMAS = _load_schemas()
+
+
+def _scalar(rnd):
+    return rnd.choice([
+        None, True, False, 0, 1, 2, -5, 10**6, '', 'a', 'ab,c',
+        'x' * rnd.randint(0, 40), 'jan@kowalski.pl', 'Zażółć', '123-456-789',
+        '/questions', 'GET', 'title', '_id', 'text', 'created_at', 'exact'
+    ])
+
+
+def _generate(rnd, schema, depth=0):
+    if rnd.random() < 0.08 or depth > 6:
+        return rnd.choice([
+            _scalar(rnd), [], {}, [_scalar(rnd), _scalar(rnd)], {'k': 1}
+        ])
+    _type = schema['_type']
+    if _type == 'dict':
+        document = {}
+        keys = [k for k in schema if k not in ('_type', 'required')]
+        rnd.shuffle(keys)
+        for k in keys:
+            if rnd.random() < 0.6:
+                document[k] = _generate(rnd, schema[k], depth + 1)
+        if rnd.random() < 0.2:
+            document[rnd.choice(['foo', 'a,b', 'x.y'])] = _scalar(rnd)
+        return document
+    if _type == 'list':
+        size = (rnd.choice([0, 1, 2, 5, 25, 120])
+                if rnd.random() < 0.3 else rnd.randint(0, 4))
+        items = schema.get('_items', {'_type': 'any'})
+        document = [_generate(rnd, items, depth + 1) for _ in range(size)]
+        if document and rnd.random() < 0.4:
+            document.append(copy.deepcopy(rnd.choice(document)))
+        rnd.shuffle(document)
+        return document
+    if _type == 'str':
+        return rnd.choice([_scalar(rnd), 'x' * rnd.randint(0, 40), 'a b'])
+    if _type == 'int':
+        return rnd.choice([_scalar(rnd), rnd.randint(-10, 10**7)])
+    if _type == 'enum':
+        return rnd.choice(schema['values'] + [_scalar(rnd)])
+    if _type == 'bool':
+        return rnd.choice([True, False, _scalar(rnd)])
+    return _scalar(rnd)
+
+
+def _documents(name, schema):
+    rnd = random.Random(name)
+    for _ in range(DOCUMENTS_PER_SCHEMA):
+        yield rnd.choice(['data', 'query']), _generate(rnd, schema)
+
+
+def _run(check, document, schema, prefix):
+    """Errors or type of raised exception."""
+    try:
+        return check(copy.deepcopy(document), schema, prefix)
+    except Exception as e:
+        return type(e)
+
+
+def _reference_fails(document, schema):
+    """Reference reads schema['required'] for every empty document, so it
+    raises KeyError for empty documents of non-dict schemas eg. []. These are
+    checked like other documents."""
+    return not document and schema['_type'] != 'dict'
+
+
+def test_schemas_found():
+    assert any(name.startswith('questions.') for name in SCHEMAS)
+
+
+@pytest.mark.parametrize('name', sorted(SCHEMAS))
+def test_same_errors_as_reference(name, monkeypatch):
+    monkeypatch.setattr(validator, 'ERROR_CAP', 0)
+    schema = SCHEMAS[name]
+    check = validator.compile_schema(schema)
+    for prefix, document in _documents(name, schema):
+        got = _run(lambda d, s, p: check(d, p), document, schema, prefix)
+        if _reference_fails(document, schema):
+            # Errors of root checker eg. {} is not a list, never an exception.
+            assert isinstance(got, list), document
+            continue
+        expected = _run(reference_validator.check, document, schema, prefix)
+        assert got == expected, document
+
+
+@pytest.mark.parametrize('cap', [1, 3, 50])
+@pytest.mark.parametrize('name', sorted(SCHEMAS))
+def test_capped_errors_are_prefix_of_reference(name, cap, monkeypatch):
+    monkeypatch.setattr(validator, 'ERROR_CAP', cap)
+    schema = SCHEMAS[name]
+    check = validator.compile_schema(schema)
+    for prefix, document in _documents(name, schema):
+        got = _run(lambda d, s, p: check(d, p), document, schema, prefix)
+        if _reference_fails(document, schema):
+            # Errors of root checker eg. {} is not a list, never an exception.
+            assert isinstance(got, list), document
+            continue
+        expected = _run(reference_validator.check, document, schema, prefix)
+        if isinstance(expected, type):
+            # Validation may stop before element the reference fails on.
+            assert got == expected or len(got) == cap, document
+        else:
+            assert got == expected[:cap], document
+
+
+def test_cap_stops_on_exactly_cap_errors(monkeypatch):
+    monkeypatch.setattr(validator, 'ERROR_CAP', 5)
+    schema = {'_type': 'dict', 'required': []}
+    document = {f'field{i}': i for i in range(20)}
+    errors = validator.check(document, schema)
+    assert len(errors) == 5
+    assert errors == reference_validator.check(document, schema)[:5]
+
+
+def test_no_cap(monkeypatch):
+    monkeypatch.setattr(validator, 'ERROR_CAP', 0)
+    schema = {'_type': 'dict', 'required': []}
+    document = {f'field{i}': i for i in range(200)}
+    assert len(validator.check(document, schema)) == 200
+
+
+def _nested(levels):
+    document = 1
+    for _ in range(levels):
+        document = [document]
+    return document
+
+
+_ANY = {'_type': 'dict', 'required': [], 'body': {'_type': 'any'}}
+
+
+def test_any_within_max_depth(monkeypatch):
+    monkeypatch.setattr(validator, 'MAX_DEPTH', 4)
+    # body is one level below document, so it can have 3 more.
+    document = {'body': _nested(3)}
+    assert validator.check(document, _ANY) == []
+    assert reference_validator.check(document, _ANY) == []
+
+
+def test_any_deeper_than_max_depth(monkeypatch):
+    monkeypatch.setattr(validator, 'MAX_DEPTH', 4)
+    errors = validator.check({'body': _nested(4)}, _ANY)
+    assert [(e['name'], e['field']) for e in errors] == [('document_too_deep',
+                                                          'data.body')]
+
+
+def test_any_depth_counts_dicts_and_lists(monkeypatch):
+    monkeypatch.setattr(validator, 'MAX_DEPTH', 3)
+    assert validator.check({'body': {'a': [1]}}, _ANY) == []
+    errors = validator.check({'body': {'a': [{'b': 1}]}}, _ANY)
+    assert [e['name'] for e in errors] == ['document_too_deep']